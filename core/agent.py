@@ -4,24 +4,31 @@ from langchain_core.output_parsers import StrOutputParser
 from loguru import logger
 import os
 import json
+import time
+import asyncio
 from datetime import datetime, timezone, timedelta
 
-class CaioAgent:
-    def __init__(self):
-        groq_key = os.getenv("GROQ_API_KEY")
-        if not groq_key:
-            logger.warning("⚠️ GROQ_API_KEY não encontrada!")
-        
-        self.llm = ChatGroq(
-            model="llama-3.3-70b-versatile",
-            api_key=groq_key,
-            temperature=0.1 # Temperatura mínima para evitar alucinações de formatação
-        )
-        
-        self.telegram_token = os.getenv("TELEGRAM_BOT_TOKEN")
-        
-        # Prompt de Sistema Ultra-Restritivo
-        self.prompt = ChatPromptTemplate.from_template("""
+from intent_rules import IntentRules
+from intent_cache import IntentCache
+from response_cache import ResponseCache
+from prompt_budget import PromptBudget
+from single_flight import SingleFlight, flight_key
+from rate_limiter import RateLimiter, INTERACTIVE, BACKGROUND, is_retryable
+from model_router import ModelRouter
+from hedging import Hedger, HEDGE_TASKS
+
+try:
+    import httpx
+except ImportError:  # Sem httpx o limitador segue só pelas próprias contas (sem headers da Groq)
+    httpx = None
+
+try:
+    from langchain_google_genai import ChatGoogleGenerativeAI
+except ImportError:  # Gemini só é usado no modo hedging (opcional)
+    ChatGoogleGenerativeAI = None
+
+# Persona e regras de formatação (compartilhadas pelos prompts de resposta)
+PERSONA = """
         Você é o Agente Caio, uma IA de elite com acesso total a ferramentas de produtividade.
         
         # SUAS CAPACIDADES REAIS (VOCÊ TEM ACESSO):
@@ -35,7 +42,101 @@ class CaioAgent:
         2. Use asterisco simples (*) para negrito: *texto em negrito*.
         3. Use datas humanas: "Segunda, 09/02 às 12:00" em vez de formatos ISO.
         4. Seja direto, elegante e proativo.
+"""
+
+# Ações que o Caio sabe executar (compartilhado entre os prompts de intenção)
+INTENT_ACTIONS = """
+        AÇÕES DISPONÍVEIS:
+        - "google_calendar_add": {"summary", "start_time", "description"}
+        - "reminder_set": {"minutes", "message"}
+        - "email_check": {"query": "is:unread"}
+        - "email_send": {"to", "subject", "body"}
+        - "brave_search": {"query"}
+        - "google_drive_upload": {"file_path"}
+"""
+
+# Separa a lista de ações da resposta no modo de chamada única em streaming
+REPLY_MARKER = "<<<RESPOSTA>>>"
+
+
+def _strip_fences(text):
+    return text.replace("```json", "").replace("```", "").strip()
+
+
+def _load_json(text):
+    """
+    JSON da resposta do modelo, tolerando cercas ```, quebras de linha dentro das
+    strings e texto antes/depois (vale o primeiro objeto/lista completo). None se não houver.
+    """
+    cleaned = _strip_fences(text)
+    try:
+        return json.loads(cleaned, strict=False)
+    except json.JSONDecodeError:
+        pass
+    decoder = json.JSONDecoder(strict=False)
+    for start in sorted(i for i in (cleaned.find("{"), cleaned.find("[")) if i >= 0):
+        try:
+            return decoder.raw_decode(cleaned, start)[0]    # Ignora o texto depois do JSON
+        except json.JSONDecodeError:
+            continue
+    return None
+
+
+def _looks_like_json(text):
+    cleaned = _strip_fences(text)
+    return cleaned.startswith(("{", "[")) or '"action"' in cleaned
+
+
+def _as_intents(value):
+    """Lista de intenções a partir do JSON do modelo; None se o formato não serve."""
+    if isinstance(value, dict):
+        return [value] if value.get("action") else None
+    if not isinstance(value, list):
+        return None
+    if not value:
+        return [{"action": "chat"}]
+    return [i for i in value if isinstance(i, dict) and i.get("action")] or None
+
+
+class _BackgroundLLM:
+    """Fachada com `ainvoke` para jobs de fundo: mesma saída para o LLM, mas com prioridade baixa na fila."""
+    def __init__(self, agent):
+        self.agent = agent
+
+    async def ainvoke(self, prompt):
+        return await self.agent._ainvoke("summary", prompt, priority=BACKGROUND)
+
+
+class CaioAgent:
+    def __init__(self):
+        groq_key = os.getenv("GROQ_API_KEY")
+        if not groq_key:
+            logger.warning("⚠️ GROQ_API_KEY não encontrada!")
+        
+        self.groq_key = groq_key
+        # Modelo por tipo de tarefa (intent, chat, summary), com failover pela latência/erros recentes
+        self.router = ModelRouter()
+        self._llms = {}
+        self._chains = {}
+        # Limites de requisições/tokens por minuto da Groq, um por modelo (as novas tentativas ficam com eles)
+        self.rate_limiters = {}
+        self.llm = self._llm_for(self.router.routes["chat"][0])
+        self.rate_limiter = self.rate_limiters[self.llm.model_name]
+        # Métodos síncronos (telegram_listener.py) ficam fora do limitador: cliente próprio com as novas tentativas do SDK
+        self.sync_llm = ChatGroq(
+            model=self.llm.model_name,
+            api_key=groq_key,
+            temperature=0.1
+        )
+        # Para a consolidação da memória e outros jobs que não têm ninguém esperando
+        self.background_llm = _BackgroundLLM(self)
+        # Reserva de tokens da resposta (a Groq conta prompt + resposta no limite por minuto)
+        self.expected_output_tokens = int(os.getenv("LLM_EXPECTED_OUTPUT_TOKENS", "400"))
         
+        self.telegram_token = os.getenv("TELEGRAM_BOT_TOKEN")
+        
+        # Prompt de Sistema Ultra-Restritivo
+        self.prompt = ChatPromptTemplate.from_template(PERSONA + """
         DATA/HORA ATUAL (Brasília): {current_time}
         DADOS DO USUÁRIO: {memories}
         
@@ -44,28 +145,80 @@ class CaioAgent:
         RESPOSTA DO CAIO:
         """)
         
-        self.chain = self.prompt | self.llm | StrOutputParser()
+        self.chain = self._runnable(self.llm.model_name, {})
+        self.sync_chain = self.prompt | self.sync_llm | StrOutputParser()
+
+        # Caminho rápido local: intenções óbvias ("oi", "me lembra em 10 min...") sem chamar o LLM
+        self.intent_rules = IntentRules() if os.getenv("INTENT_FAST_PATH", "1") == "1" else None
+        # Intenções já extraídas pelo LLM, com horários relativos (resolvidos no uso)
+        self.intent_cache = IntentCache()
+        # Respostas de chat reaproveitadas para perguntas quase iguais (opcional)
+        self.response_cache = ResponseCache() if os.getenv("RESPONSE_CACHE", "0") == "1" else None
+        # Orçamento de tokens para memórias e resultados de busca no prompt
+        self.budget = PromptBudget()
+        # Modo de chamada única: intenção + resposta de chat no mesmo request (0 = duas chamadas)
+        self.single_call = os.getenv("AGENT_SINGLE_CALL", "1") == "1"
+        # Limite global de chamadas ao LLM em andamento (todas as conversas juntas)
+        self._llm_slots = asyncio.Semaphore(int(os.getenv("LLM_MAX_CONCURRENCY", "4")))
+        # Requisições idênticas em voo ao mesmo tempo viram uma só (mensagem enviada em dobro etc.)
+        self.single_flight = SingleFlight() if os.getenv("LLM_COALESCE", "1") == "1" else None
+        # Hedging (opcional): resposta lenta da Groq ganha uma cópia no Gemini e a primeira resposta vale
+        self.hedger = None
+        self.secondary_llm = None
+        self._secondary_chain = None
+        if os.getenv("LLM_HEDGE", "0") == "1":
+            google_key = os.getenv("GOOGLE_API_KEY")
+            if ChatGoogleGenerativeAI is None or not google_key:
+                logger.warning("⚠️ LLM_HEDGE=1 requer langchain-google-genai e GOOGLE_API_KEY: hedging desligado.")
+            else:
+                self.secondary_llm = ChatGoogleGenerativeAI(
+                    model=os.getenv("GEMINI_MODEL", "gemini-2.0-flash"),
+                    google_api_key=google_key,
+                    temperature=0.1
+                )
+                self.hedger = Hedger()
+
+    def _llm_for(self, model):
+        """ChatGroq do modelo, criado na primeira vez com o seu próprio limitador (a Groq limita por modelo)."""
+        if model not in self._llms:
+            limiter = self.rate_limiters[model] = RateLimiter()
+            client_kwargs = {}
+            if httpx is not None:
+                client_kwargs["http_async_client"] = limiter.install(httpx.AsyncClient(timeout=60))
+            self._llms[model] = ChatGroq(
+                model=model,
+                api_key=self.groq_key,
+                temperature=0.1, # Temperatura mínima para evitar alucinações de formatação
+                max_retries=0,
+                **client_kwargs
+            )
+        return self._llms[model]
+
+    def _runnable(self, model, payload):
+        """Prompt pronto (str) vai direto ao modelo; entradas da chain (dict) passam pelo template da persona."""
+        if not isinstance(payload, dict):
+            return self._llm_for(model)
+        if model not in self._chains:
+            self._chains[model] = self.prompt | self._llm_for(model) | StrOutputParser()
+        return self._chains[model]
+
+    def _local_intents(self, text, now):
+        """Intenções sem LLM: regras locais e, depois, o cache de intenções."""
+        if self.intent_rules is not None:
+            intents = self.intent_rules.classify(text)
+            if intents is not None:
+                return intents
+        return self.intent_cache.get(text, now)
     
-    def detect_intent(self, text):
-        """Extração de intenções múltiplas com validação rigorosa."""
-        br_tz = timezone(timedelta(hours=-3))
-        now = datetime.now(br_tz)
-        now_str = now.strftime("%Y-%m-%d %H:%M:%S %z")
-        
-        prompt = f"""
+    def _intent_prompt(self, text, now):
+        # Hora no minuto (sem segundos): a mesma mensagem enviada duas vezes gera o mesmo prompt e vira uma chamada só
+        now_str = now.strftime("%Y-%m-%d %H:%M %z")
+        return f"""
         Analise a mensagem: "{text}"
         Data/Hora atual: {now_str}
         
         Extraia TODAS as ações necessárias em uma LISTA JSON.
-        
-        AÇÕES DISPONÍVEIS:
-        - "google_calendar_add": {{"summary", "start_time", "description"}}
-        - "reminder_set": {{"minutes", "message"}}
-        - "email_check": {{"query": "is:unread"}}
-        - "email_send": {{"to", "subject", "body"}}
-        - "brave_search": {{"query"}}
-        - "google_drive_upload": {{"file_path"}}
-        
+        {INTENT_ACTIONS}
         EXEMPLO PARA "Agendar X e me lembrar em 1 min":
         [
             {{"action": "google_calendar_add", "summary": "X", "start_time": "..."}},
@@ -74,28 +227,464 @@ class CaioAgent:
         
         Retorne APENAS o JSON.
         """
-        
+
+    def _parse_intents(self, response, text, now):
+        intents = _as_intents(_load_json(response))
+        if intents is None:
+            raise ValueError(f"resposta sem intenções: {response[:80]!r}")
+        self.intent_cache.put(text, intents, now)
+        return intents
+
+    def detect_intent(self, text):
+        """Extração de intenções múltiplas com validação rigorosa."""
+        br_tz = timezone(timedelta(hours=-3))
+        now = datetime.now(br_tz)
+        local = self._local_intents(text, now)
+        if local is not None:
+            return local
+        try:
+            return self._parse_intents(self.sync_llm.invoke(self._intent_prompt(text, now)).content, text, now)
+        except Exception as e:
+            logger.error(f"Erro Intent: {e}")
+            return [{"action": "chat"}]
+
+    async def adetect_intent(self, text):
+        """detect_intent() sem bloquear o event loop."""
+        br_tz = timezone(timedelta(hours=-3))
+        now = datetime.now(br_tz)
+        local = self._local_intents(text, now)
+        if local is not None:
+            return local
+        try:
+            response = await self._ainvoke("intent", self._intent_prompt(text, now))
+            return self._parse_intents(response.content, text, now)
+        except Exception as e:
+            logger.error(f"Erro Intent: {e}")
+            return [{"action": "chat"}]
+
+    # === CHAMADA ÚNICA (ações + resposta) ===
+    def _plan_prompt(self, text, memories, now):
+        memories_text = self.budget.pack_memories(memories)
+        return f"""{PERSONA}
+        DATA/HORA ATUAL (Brasília): {now.strftime("%Y-%m-%d %H:%M %z")}
+        DADOS DO USUÁRIO: {memories_text}
+
+        MENSAGEM: "{text}"
+
+        Decida as ações necessárias para a mensagem.
+        {INTENT_ACTIONS}
+        - "chat": conversa normal (sem ferramenta)
+        """
+
+    def _json_plan_prompt(self, text, memories, now):
+        return self._plan_prompt(text, memories, now) + """
+        Retorne APENAS um objeto JSON:
+        {"actions": [{"action": "...", ...}], "reply": "..."}
+        "reply" é a resposta do Caio ao usuário (seguindo as regras acima) e só é usado
+        quando a única ação é "chat"; nos outros casos deixe "reply" vazio.
+        """
+
+    def _parse_plan(self, response, text, now):
+        """Intenções do plano (com "reply" no chat); None se a resposta não serve e é preciso usar duas chamadas."""
+        plan = _load_json(response)
+        if plan is None and not _looks_like_json(response):
+            # O modelo respondeu direto em texto: é uma resposta de chat
+            return [{"action": "chat", "reply": response.replace("**", "*").strip()}]
+        reply = ""
+        if isinstance(plan, dict) and not plan.get("action"):
+            reply = plan.get("reply") or ""
+            intents = _as_intents(plan.get("actions") or [])
+        else:
+            intents = _as_intents(plan)     # Lista de ações ou uma ação solta
+        if intents is None:
+            # JSON quebrado ou fora do formato: nunca vai cru para o usuário
+            logger.warning(f"⚠️ Plano do LLM fora do formato, usando duas chamadas: {response[:80]!r}")
+            return None
+        # A resposta depende das memórias; só as ações vão para o cache
+        self.intent_cache.put(text, intents, now)
+        reply = reply.strip() if isinstance(reply, str) else ""
+        if reply:
+            for intent in intents:
+                if intent.get("action") == "chat":
+                    intent["reply"] = reply.replace("**", "*")
+        return intents
+
+    def _local_plan(self, text, memories, now):
+        """
+        Plano sem LLM no modo de chamada única: regras locais, depois o cache de respostas
+        (chat já respondido, com "reply") e o cache de intenções.
+        Retorna (intenções ou None, chave para guardar a resposta nova).
+        """
+        if self.intent_rules is not None:
+            intents = self.intent_rules.classify(text)
+            if intents is not None:
+                return intents, None
+        cached, key = self._cached_reply(text, memories, True)
+        if cached is not None:
+            return [{"action": "chat", "reply": cached}], None
+        return self.intent_cache.get(text, now), key
+
+    def _store_plan_reply(self, key, intents, start):
+        # Só planos de chat puro: com ferramenta, a mesma frase pode pedir outra ação
+        if key is not None and len(intents) == 1 and intents[0].get("reply"):
+            self.response_cache.put(key, intents[0]["reply"], time.perf_counter() - start)
+
+    def plan_and_respond(self, text, memories):
+        """
+        Modo de chamada única: um só request devolve as ações e, quando a ação é "chat",
+        já traz a resposta em intent["reply"] (sem a segunda chamada de generate_message).
+        Intenções resolvidas localmente (regras/cache) não trazem "reply".
+        """
+        br_tz = timezone(timedelta(hours=-3))
+        now = datetime.now(br_tz)
+        local, key = self._local_plan(text, memories, now)
+        if local is not None:
+            return local
         try:
-            response = self.llm.invoke(prompt).content
-            response = response.replace("```json", "").replace("```", "").strip()
-            intents = json.loads(response)
-            return intents if isinstance(intents, list) else [intents]
+            start = time.perf_counter()
+            response = self.sync_llm.invoke(self._json_plan_prompt(text, memories, now)).content
         except Exception as e:
             logger.error(f"Erro Intent: {e}")
             return [{"action": "chat"}]
+        intents = self._parse_plan(response, text, now)
+        if intents is None:
+            return self.detect_intent(text)
+        self._store_plan_reply(key, intents, start)
+        return intents
+
+    async def aplan_and_respond(self, text, memories):
+        """plan_and_respond() sem bloquear o event loop."""
+        br_tz = timezone(timedelta(hours=-3))
+        now = datetime.now(br_tz)
+        local, key = self._local_plan(text, memories, now)
+        if local is not None:
+            return local
+        try:
+            start = time.perf_counter()
+            response = (await self._ainvoke("chat", self._json_plan_prompt(text, memories, now))).content
+        except Exception as e:
+            logger.error(f"Erro Intent: {e}")
+            return [{"action": "chat"}]
+        intents = self._parse_plan(response, text, now)
+        if intents is None:
+            return await self.adetect_intent(text)
+        self._store_plan_reply(key, intents, start)
+        return intents
+
+    async def astream_plan(self, text, memories):
+        """
+        plan_and_respond() em streaming. O modelo escreve primeiro a lista de ações,
+        depois REPLY_MARKER e a resposta; as ações são devolvidas assim que chegam.
+        Retorna (intenções, pedaços da resposta de chat ou None).
+        """
+        br_tz = timezone(timedelta(hours=-3))
+        now = datetime.now(br_tz)
+        local, key = self._local_plan(text, memories, now)
+        if local is not None:
+            return local, None
+
+        prompt = self._plan_prompt(text, memories, now) + f"""
+        Responda EXATAMENTE neste formato:
+        1. Primeiro a LISTA JSON de ações, ex: [{{"action": "chat"}}]
+        2. Depois, numa linha sozinha: {REPLY_MARKER}
+        3. Depois do marcador, a resposta do Caio ao usuário (seguindo as regras acima),
+           só quando a única ação for "chat".
+        """
+        start = time.perf_counter()
+        stream = self._astream("chat", prompt)
+        buffer = ""
+        try:
+            async for chunk in stream:
+                buffer += chunk.content
+                if REPLY_MARKER in buffer:
+                    break
+        except Exception as e:
+            logger.error(f"Erro Intent: {e}")
+            return [{"action": "chat"}], None
+
+        head, found, tail = buffer.partition(REPLY_MARKER)
+        parsed = _load_json(head)
+        if parsed is None and not _looks_like_json(head):
+            # O modelo respondeu direto em texto: é tudo resposta de chat
+            return [{"action": "chat"}], self._continue_stream(stream, tail if found else buffer, key, start)
+        intents = _as_intents(parsed)
+        if intents is None:
+            # JSON quebrado ou fora do formato: nunca vai cru para o usuário
+            await stream.aclose()
+            logger.warning(f"⚠️ Plano do LLM fora do formato, usando duas chamadas: {head[:80]!r}")
+            return await self.adetect_intent(text), None
+        self.intent_cache.put(text, intents, now)
+        if found and any(i.get("action") == "chat" for i in intents):
+            # Só chat puro vai para o cache de respostas
+            return intents, self._continue_stream(stream, tail.lstrip(), key if len(intents) == 1 else None, start)
+        await stream.aclose()   # Não precisa da resposta: para de gerar
+        return intents, None
 
-    def generate_message(self, task_description, memories):
+    async def _continue_stream(self, stream, first, key=None, start=None):
+        parts = []
+        try:
+            if first:
+                parts.append(first)
+                yield first
+            async for chunk in stream:
+                if chunk.content:
+                    parts.append(chunk.content)
+                    yield chunk.content
+        finally:
+            await stream.aclose()   # Libera a vaga do LLM mesmo se a resposta for abandonada
+        # Só chega aqui se a resposta foi lida até o fim
+        if key is not None:
+            self.response_cache.put(key, "".join(parts).replace("**", "*").strip(), time.perf_counter() - start)
+
+    def _chain_inputs(self, task_description, memories):
         br_tz = timezone(timedelta(hours=-3))
-        current_time = datetime.now(br_tz).strftime("%d/%m/%Y %H:%M")
+        memories_text = self.budget.pack_memories(memories)
+        return {
+            "task": task_description,
+            "memories": memories_text,
+            "current_time": datetime.now(br_tz).strftime("%d/%m/%Y %H:%M"),
+            "agent_name": os.getenv("AGENT_NAME", "Caio")
+        }
+
+    def _cached_reply(self, task_description, memories, cacheable):
+        """Retorna (resposta em cache ou None, chave para guardar a resposta nova)."""
+        if self.response_cache is None or not cacheable:
+            return None, None
+        return self.response_cache.lookup(task_description, memories)
+
+    def generate_message(self, task_description, memories, cacheable=True):
+        cached, key = self._cached_reply(task_description, memories, cacheable)
+        if cached is not None:
+            return cached
         try:
-            memories_text = "\n".join([f"- {m['content']}" for m in memories]) if memories else "Nenhuma."
-            response = self.chain.invoke({
-                "task": task_description,
-                "memories": memories_text,
-                "current_time": current_time,
-                "agent_name": os.getenv("AGENT_NAME", "Caio")
-            })
+            start = time.perf_counter()
+            response = self.sync_chain.invoke(self._chain_inputs(task_description, memories))
             # Filtro de segurança final para remover **
-            return response.replace("**", "*")
+            response = response.replace("**", "*")
+            if key is not None:
+                self.response_cache.put(key, response, time.perf_counter() - start)
+            return response
+        except Exception as e:
+            return f"Erro: {e}"
+
+    async def astream_message(self, task_description, memories, cacheable=True):
+        """generate_message() em streaming (chain.astream): a resposta chega em pedaços."""
+        cached, key = self._cached_reply(task_description, memories, cacheable)
+        if cached is not None:
+            yield cached
+            return
+        parts = []
+        try:
+            start = time.perf_counter()
+            async for chunk in self._astream("chat", self._chain_inputs(task_description, memories)):
+                parts.append(chunk)
+                yield chunk
+        except Exception as e:
+            yield f"\nErro: {e}"
+            return
+        if key is not None:
+            self.response_cache.put(key, "".join(parts).replace("**", "*"), time.perf_counter() - start)
+
+    async def agenerate_message(self, task_description, memories, cacheable=True):
+        """generate_message() sem bloquear o event loop."""
+        cached, key = self._cached_reply(task_description, memories, cacheable)
+        if cached is not None:
+            return cached
+        try:
+            start = time.perf_counter()
+            response = await self._ainvoke("chat", self._chain_inputs(task_description, memories))
+            response = response.replace("**", "*")
+            if key is not None:
+                self.response_cache.put(key, response, time.perf_counter() - start)
+            return response
         except Exception as e:
             return f"Erro: {e}"
+
+    # === PONTO ÚNICO DE SAÍDA PARA O LLM ===
+    async def _ainvoke(self, task, payload, priority=INTERACTIVE):
+        """
+        Toda chamada assíncrona ao LLM passa por aqui: coalescência, escolha do modelo
+        da tarefa (intent, chat, summary), limite de taxa e de requisições em voo.
+        """
+        if self.single_flight is None:
+            return await self._dispatch_invoke(task, payload, priority)
+        key = flight_key(task, payload)
+        return await self.single_flight.do(key, lambda: self._dispatch_invoke(task, payload, priority))
+
+    async def _astream(self, task, payload, priority=INTERACTIVE):
+        """Como _ainvoke(), em streaming: a vaga fica ocupada até o fim do stream."""
+        if self.single_flight is None:
+            stream = self._dispatch_stream(task, payload, priority)
+        else:
+            key = flight_key(task, payload)
+            stream = self.single_flight.stream(key, lambda: self._dispatch_stream(task, payload, priority))
+        try:
+            async for chunk in stream:
+                yield chunk
+        finally:
+            await stream.aclose()
+
+    # === HEDGING (Groq primário, Gemini secundário) ===
+    def _hedged(self, task, priority):
+        return self.hedger is not None and task in HEDGE_TASKS and priority == INTERACTIVE
+
+    async def _dispatch_invoke(self, task, payload, priority):
+        if not self._hedged(task, priority):
+            return await self._routed_invoke(task, payload, priority)
+        return await self.hedger.invoke(
+            lambda: self._routed_invoke(task, payload, priority),
+            lambda: self._secondary_invoke(task, payload)
+        )
+
+    def _dispatch_stream(self, task, payload, priority):
+        if not self._hedged(task, priority):
+            return self._routed_stream(task, payload, priority)
+        return self.hedger.stream(
+            lambda: self._routed_stream(task, payload, priority),
+            lambda: self._secondary_stream(task, payload)
+        )
+
+    def _secondary_runnable(self, payload):
+        if not isinstance(payload, dict):
+            return self.secondary_llm
+        if self._secondary_chain is None:
+            self._secondary_chain = self.prompt | self.secondary_llm | StrOutputParser()
+        return self._secondary_chain
+
+    async def _secondary_invoke(self, task, payload):
+        model = f"gemini:{self.secondary_llm.model}"
+        start = time.perf_counter()
+        try:
+            response = await self._secondary_runnable(payload).ainvoke(payload)
+        except Exception:
+            self.router.record(task, model, time.perf_counter() - start, False)
+            raise
+        self.router.record(task, model, time.perf_counter() - start, True)
+        return response
+
+    async def _secondary_stream(self, task, payload):
+        model = f"gemini:{self.secondary_llm.model}"
+        start = time.perf_counter()
+        started = False
+        try:
+            async for chunk in self._secondary_runnable(payload).astream(payload):
+                if not started:
+                    started = True
+                    self.router.record(task, model, time.perf_counter() - start, True)
+                yield chunk
+        except Exception:
+            if not started:
+                self.router.record(task, model, time.perf_counter() - start, False)
+            raise
+
+    def _failover_retries(self, model, last):
+        """Com outro modelo na fila, uma nova tentativa só; no último, todas as configuradas."""
+        retries = self.rate_limiters[model].max_retries if model in self.rate_limiters else 0
+        return retries if last else min(1, retries)
+
+    async def _routed_invoke(self, task, payload, priority):
+        candidates = self.router.candidates(task)
+        for i, model in enumerate(candidates):
+            last = i == len(candidates) - 1
+            self._llm_for(model)
+            start = time.perf_counter()
+            try:
+                response = await self._upstream_invoke(model, payload, priority, self._failover_retries(model, last))
+            except Exception as e:
+                self.router.record(task, model, time.perf_counter() - start, False)
+                if last:
+                    raise
+                logger.warning(f"🧭 {task}: {model} falhou ({type(e).__name__}); tentando {candidates[i + 1]}")
+                continue
+            self.router.record(task, model, time.perf_counter() - start, True)
+            return response
+
+    async def _routed_stream(self, task, payload, priority):
+        """Failover só antes do primeiro pedaço; a latência registrada é até o primeiro pedaço."""
+        candidates = self.router.candidates(task)
+        for i, model in enumerate(candidates):
+            last = i == len(candidates) - 1
+            self._llm_for(model)
+            start = time.perf_counter()
+            started = False
+            stream = self._upstream_stream(model, payload, priority, self._failover_retries(model, last))
+            try:
+                async for chunk in stream:
+                    if not started:
+                        started = True
+                        self.router.record(task, model, time.perf_counter() - start, True)
+                    yield chunk
+                if not started:
+                    self.router.record(task, model, time.perf_counter() - start, True)
+                return
+            except Exception as e:
+                if started:
+                    raise   # Parte da resposta já saiu: trocar de modelo duplicaria o texto
+                self.router.record(task, model, time.perf_counter() - start, False)
+                if last:
+                    raise
+                logger.warning(f"🧭 {task}: {model} falhou ({type(e).__name__}); tentando {candidates[i + 1]}")
+            finally:
+                await stream.aclose()
+
+    def _estimate_tokens(self, payload):
+        """Tokens reservados no limitador: prompt (a chain ainda soma a persona) + resposta esperada."""
+        text = payload if isinstance(payload, str) else PERSONA + "\n".join(str(v) for v in payload.values())
+        return self.budget.tokenizer.count(text) + self.expected_output_tokens
+
+    async def _retry_wait(self, limiter, attempt, max_retries, error):
+        """Espera antes da próxima tentativa; relança se o erro não é transitório ou acabaram as tentativas."""
+        if attempt >= max_retries or not is_retryable(error):
+            raise error
+        delay = limiter.backoff(attempt, error)
+        logger.warning(f"🚦 LLM recusou ({type(error).__name__}); nova tentativa em {delay:.1f}s")
+        await asyncio.sleep(delay)
+
+    async def _upstream_invoke(self, model, payload, priority, max_retries):
+        limiter = self.rate_limiters[model]
+        runnable = self._runnable(model, payload)
+        reserved = self._estimate_tokens(payload)
+        attempt = 0
+        while True:
+            await limiter.acquire(reserved, priority)
+            try:
+                async with self._llm_slots:
+                    response = await runnable.ainvoke(payload)
+            except Exception as e:
+                limiter.settle(reserved, 0)
+                await self._retry_wait(limiter, attempt, max_retries, e)
+                attempt += 1
+                continue
+            usage = getattr(response, "usage_metadata", None) or {}
+            limiter.settle(reserved, usage.get("total_tokens"))
+            return response
+
+    async def _upstream_stream(self, model, payload, priority, max_retries):
+        limiter = self.rate_limiters[model]
+        runnable = self._runnable(model, payload)
+        reserved = self._estimate_tokens(payload)
+        attempt = 0
+        while True:
+            await limiter.acquire(reserved, priority)
+            stream = runnable.astream(payload)
+            try:
+                # A vaga cobre só a conexão e o primeiro pedaço: o stream de um plano fica aberto
+                # enquanto o mesmo turno chama o LLM de novo, e segurar a vaga travaria os dois
+                async with self._llm_slots:
+                    first = await anext(stream)
+            except StopAsyncIteration:
+                return
+            except Exception as e:
+                await stream.aclose()
+                limiter.settle(reserved, 0)
+                await self._retry_wait(limiter, attempt, max_retries, e)
+                attempt += 1
+                continue
+            # Depois do primeiro pedaço um erro sobe direto: repetir duplicaria o texto
+            try:
+                yield first
+                async for chunk in stream:
+                    yield chunk
+            finally:
+                await stream.aclose()
+            return
@@ -0,0 +1,240 @@
+"""
+Benchmark da memória do Caio.
+
+  python bench_memory.py suite [--sizes 1000,10000,100000,1000000] [--backends journal,json,sqlite]
+                               [--queries 200] [--out resultado.json]
+      Para cada backend e tamanho de corpus sintético mede: vazão do store(),
+      tempo de carga (completa e preguiçosa), latência p50/p99 do recall(),
+      RSS e tamanho em disco. Cada medição roda num subprocesso limpo
+      (sem cache de import/arquivo do processo anterior) e o resultado sai em JSON,
+      para comparar versões.
+
+  python bench_memory.py layout [N]
+      Compara o custo em RAM de N memórias como lista de dicts (formato antigo)
+      e como EpisodicLog (colunas).
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+
+from memory_log import EpisodicLog
+
+WORDS = ("python", "café", "reunião", "academia", "mercado", "lembrar", "projeto",
+         "cliente", "viagem", "livro", "médico", "treino", "conta", "email", "bot")
+DEFAULT_SIZES = (1_000, 10_000, 100_000, 1_000_000)
+DEFAULT_BACKENDS = ("journal", "json", "sqlite")
+FLUSH_EVERY = 1000      # store() entre flushes (como o escritor de fundo coalescendo)
+
+
+def synthetic_entries(n, seed=42):
+    """Memórias sintéticas parecidas com as reais (frases curtas, poucas origens)."""
+    rng = random.Random(seed)
+    now = time.time()
+    for i in range(n):
+        ts = now - (n - i) * 60
+        yield {
+            "content": " ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 12))) + f" #{i}",
+            "source": rng.choice(("chat", "chat", "chat", "reminder")),
+            "importance": rng.randint(1, 5),
+            "timestamp": ts,
+            "date": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts)),
+        }
+
+
+def synthetic_queries(n_entries, count, seed=7):
+    """Metade consultas genéricas (muitos candidatos), metade por id (memória específica, às vezes fria)."""
+    rng = random.Random(seed)
+    queries = []
+    for i in range(count):
+        if i % 2:
+            queries.append(f"{rng.choice(WORDS)} {rng.randrange(n_entries)}")
+        else:
+            queries.append(" ".join(rng.sample(WORDS, 2)))
+    return queries
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _rss_mb():
+    try:
+        import resource     # Só existe em Unix
+    except ImportError:
+        # Windows: pico do tracemalloc, se estiver ligado (só alocações do Python)
+        if tracemalloc.is_tracing():
+            return round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1)
+        return "n/a"
+    # ru_maxrss: pico do processo, em KiB no Linux e em bytes no macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _disk_mb(workdir):
+    total = 0
+    for root, _, files in os.walk(workdir):
+        total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return round(total / (1024 * 1024), 2)
+
+
+def _quiet_logs():
+    from loguru import logger
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+
+def phase_build(backend, n, workdir):
+    """Subprocesso 1: grava o corpus pelo store() e mede a vazão."""
+    _quiet_logs()
+    from memory import MemorySystem
+    memory = MemorySystem(os.path.join(workdir, "brain.json"), storage=backend, lazy_load=False)
+    start = time.perf_counter()
+    for i, entry in enumerate(synthetic_entries(n), 1):
+        memory.store(entry["content"], source=entry["source"], importance=entry["importance"],
+                     flush=False, timestamp=entry["timestamp"])
+        if i % FLUSH_EVERY == 0:
+            memory.flush()
+    memory.close()
+    elapsed = time.perf_counter() - start
+    return {"build_s": round(elapsed, 3), "store_per_s": round(n / elapsed, 1), "disk_mb": _disk_mb(workdir)}
+
+
+def phase_query(backend, n, workdir, queries):
+    """Subprocesso 2: carga a frio (completa e preguiçosa) e latência do recall()."""
+    _quiet_logs()
+    from memory import MemorySystem
+    path = os.path.join(workdir, "brain.json")
+
+    start = time.perf_counter()
+    lazy = MemorySystem(path, storage=backend, lazy_load=True)
+    lazy_ready = time.perf_counter() - start
+    lazy.ensure_loaded()
+    lazy_full = time.perf_counter() - start
+    lazy.close()
+
+    start = time.perf_counter()
+    memory = MemorySystem(path, storage=backend, lazy_load=False)
+    load = time.perf_counter() - start
+
+    latencies = []
+    hits = 0
+    for query in synthetic_queries(n, queries):
+        t = time.perf_counter()
+        hits += bool(memory.recall(query))
+        latencies.append((time.perf_counter() - t) * 1000)
+    memory.close()
+    return {
+        "load_s": round(load, 4),
+        "lazy_ready_s": round(lazy_ready, 4),
+        "lazy_full_s": round(lazy_full, 4),
+        "recall_p50_ms": round(_percentile(latencies, 0.50), 3),
+        "recall_p99_ms": round(_percentile(latencies, 0.99), 3),
+        "recall_hit_ratio": round(hits / len(latencies), 3),
+        "rss_mb": _rss_mb(),
+    }
+
+
+def _run_child(args, env):
+    out = subprocess.run([sys.executable, os.path.abspath(__file__)] + [str(a) for a in args],
+                         capture_output=True, text=True, env=env)
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr.strip().splitlines()[-1] if out.stderr.strip() else f"código {out.returncode}")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def bench_suite(sizes, backends, queries):
+    # Cache de recall desligado: queremos a latência da busca, não do LRU
+    env = dict(os.environ, MEMORY_RECALL_CACHE="0", MEMORY_ARCHIVE="1", MEMORY_RECALL_MODE="bm25")
+    results = []
+    for backend in backends:
+        for n in sizes:
+            workdir = tempfile.mkdtemp(prefix=f"caio-bench-{backend}-{n}-")
+            row = {"backend": backend, "entries": n}
+            try:
+                row.update(_run_child(["_build", backend, n, workdir], env))
+                row.update(_run_child(["_query", backend, n, workdir, queries], env))
+            except Exception as e:
+                row["error"] = str(e)
+            finally:
+                shutil.rmtree(workdir, ignore_errors=True)
+            print(json.dumps(row, ensure_ascii=False), file=sys.stderr)
+            results.append(row)
+    return {
+        "meta": {
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "queries": queries,
+        },
+        "results": results,
+    }
+
+
+def _measure(build):
+    tracemalloc.start()
+    start = time.perf_counter()
+    obj = build()
+    elapsed = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return obj, current, elapsed
+
+
+def bench_layout(n):
+    # Os textos são os mesmos nos dois formatos, então entram na conta de ambos
+    dicts, dict_bytes, dict_secs = _measure(lambda: [dict(e) for e in synthetic_entries(n)])
+    log, log_bytes, log_secs = _measure(lambda: EpisodicLog.from_dicts(synthetic_entries(n)))
+    return {
+        "entries": n,
+        "dicts": {"bytes": dict_bytes, "bytes_per_entry": round(dict_bytes / n, 1), "build_s": round(dict_secs, 3)},
+        "columnar": {"bytes": log_bytes, "bytes_per_entry": round(log_bytes / n, 1), "build_s": round(log_secs, 3)},
+        "saving": round(1 - log_bytes / dict_bytes, 3) if dict_bytes else 0.0,
+    }
+
+
+def main(argv):
+    command = argv[0] if argv else "suite"
+    # Fases internas (rodam no subprocesso e imprimem uma linha JSON)
+    if command == "_build":
+        print(json.dumps(phase_build(argv[1], int(argv[2]), argv[3])))
+    elif command == "_query":
+        print(json.dumps(phase_query(argv[1], int(argv[2]), argv[3], int(argv[4]))))
+    elif command == "layout":
+        print(json.dumps(bench_layout(int(argv[1]) if len(argv) > 1 else 100_000), indent=2))
+    elif command == "suite":
+        parser = argparse.ArgumentParser(prog="bench_memory.py suite")
+        parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)))
+        parser.add_argument("--backends", default=",".join(DEFAULT_BACKENDS))
+        parser.add_argument("--queries", type=int, default=200)
+        parser.add_argument("--out")
+        args = parser.parse_args(argv[1:])
+        report = bench_suite([int(s) for s in args.sizes.split(",")], args.backends.split(","), args.queries)
+        text = json.dumps(report, indent=2, ensure_ascii=False)
+        if args.out:
+            with open(args.out, 'w', encoding='utf-8') as f:
+                f.write(text + "\n")
+        print(text)
+    else:
+        sys.exit(f"Comando desconhecido: {command}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
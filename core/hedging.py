@@ -0,0 +1,159 @@
+import os
+import time
+import asyncio
+from collections import deque
+from loguru import logger
+
+HEDGE_TASKS = ("chat",)     # Só respostas com alguém esperando
+
+
+async def _cancel(task):
+    task.cancel()
+    try:
+        await task
+    except BaseException:
+        pass
+
+
+class Hedger:
+    """
+    Requisições "hedged" entre dois provedores.
+    A chamada vai ao primário; se ele não responder dentro do p90 recente da sua
+    própria latência, uma cópia vai ao secundário e a primeira resposta completa
+    (em streaming, o primeiro pedaço) ganha, cancelando a outra.
+    Só uma fração `budget` das requisições pode ganhar cópia, então o gasto extra
+    fica limitado e aparece em stats().
+    """
+    def __init__(self, budget=None, initial_delay=None, min_delay=None, max_delay=None, window=100):
+        self.budget = budget if budget is not None else float(os.getenv("LLM_HEDGE_BUDGET", "0.1"))
+        self.initial_delay = initial_delay if initial_delay is not None else float(os.getenv("LLM_HEDGE_DELAY", "2.0"))
+        self.min_delay = min_delay if min_delay is not None else float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.5"))
+        self.max_delay = max_delay if max_delay is not None else float(os.getenv("LLM_HEDGE_MAX_DELAY", "10"))
+        self.latencies = deque(maxlen=window)   # Latência do primário (s)
+        self.requests = 0
+        self.hedged = 0
+        self.secondary_wins = 0
+
+    def delay(self):
+        """Espera antes da cópia: p90 das latências recentes do primário (limitado a [min, max])."""
+        if len(self.latencies) < 10:
+            return self.initial_delay
+        ordered = sorted(self.latencies)
+        p90 = ordered[min(len(ordered) - 1, int(0.9 * len(ordered)))]
+        return min(self.max_delay, max(self.min_delay, p90))
+
+    def _may_hedge(self):
+        # +1: permite a primeira cópia antes de acumular crédito
+        return self.hedged < self.budget * self.requests + 1
+
+    def _count(self):
+        self.requests += 1
+        if self.requests % 50 == 0:
+            logger.info(f"🪁 Hedging: {self.stats()}")
+
+    async def invoke(self, primary, secondary):
+        """`primary()` e `secondary()` são corrotinas de chamada; retorna a primeira resposta completa."""
+        self._count()
+        start = time.monotonic()
+        first = asyncio.ensure_future(primary())
+        try:
+            done, _ = await asyncio.wait({first}, timeout=self.delay())
+            if done or not self._may_hedge():
+                result = await first
+                self.latencies.append(time.monotonic() - start)
+                return result
+        except BaseException:
+            await _cancel(first)
+            raise
+
+        self.hedged += 1
+        logger.debug(f"🪁 Primário sem resposta em {time.monotonic() - start:.1f}s: enviando cópia ao secundário")
+        second = asyncio.ensure_future(secondary())
+        pending = {first, second}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = error or task.exception()
+                        continue
+                    self._finish(task is first, start)
+                    return task.result()
+            raise error
+        finally:
+            for task in pending:
+                await _cancel(task)
+
+    async def stream(self, open_primary, open_secondary):
+        """Como invoke(), para streaming: ganha quem entregar o primeiro pedaço; segue só com ele."""
+        self._count()
+        start = time.monotonic()
+        streams = {}
+
+        def begin(open_stream):
+            stream = open_stream()
+            task = asyncio.ensure_future(anext(stream))
+            streams[task] = stream
+            return task
+
+        first = begin(open_primary)
+        winner = None
+        try:
+            done, _ = await asyncio.wait({first}, timeout=self.delay())
+            if done or not self._may_hedge():
+                await asyncio.wait({first})
+                self.latencies.append(time.monotonic() - start)
+                winner = first
+            else:
+                self.hedged += 1
+                logger.debug(f"🪁 Primário sem resposta em {time.monotonic() - start:.1f}s: enviando cópia ao secundário")
+                pending = {first, begin(open_secondary)}
+                error = None
+                while pending and winner is None:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        exc = task.exception()
+                        if exc is None or isinstance(exc, StopAsyncIteration):
+                            winner = task
+                            self._finish(task is first, start)
+                            break
+                        error = error or exc
+                if winner is None:
+                    raise error
+        finally:
+            # Perdedores (ou todos, se o consumidor desistiu): cancela e fecha o stream
+            for task, stream in streams.items():
+                if task is not winner:
+                    await _cancel(task)
+                    await stream.aclose()
+
+        stream = streams[winner]
+        try:
+            try:
+                chunk = winner.result()
+            except StopAsyncIteration:
+                return
+            yield chunk
+            async for chunk in stream:
+                yield chunk
+        finally:
+            await stream.aclose()
+
+    def _finish(self, primary_won, start):
+        # Se o secundário ganhou, o primário levaria pelo menos isso: entra na janela como limite inferior
+        elapsed = time.monotonic() - start
+        self.latencies.append(elapsed)
+        if not primary_won:
+            self.secondary_wins += 1
+            logger.debug(f"🪁 Secundário respondeu primeiro ({elapsed:.2f}s)")
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "hedged": self.hedged,
+            "hedge_ratio": round(self.hedged / self.requests, 4) if self.requests else 0.0,
+            "secondary_wins": self.secondary_wins,
+            "delay_s": round(self.delay(), 3),
+            "budget": self.budget,
+        }
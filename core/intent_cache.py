@@ -0,0 +1,161 @@
+import os
+import re
+import copy
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from loguru import logger
+
+from memory_index import TOKEN_RE, normalize
+
+# Referências a dias da semana mudam de sentido conforme o dia de hoje: não dá para cachear
+WEEKDAY_RE = re.compile(
+    r"\b(segunda|terca|quarta|quinta|sexta|sabado|domingo|monday|tuesday|wednesday|thursday|friday|saturday|sunday)\b"
+)
+# Datas explícitas ("15/03", "2026-03-15") já são absolutas: ficam como estão
+DATE_RE = re.compile(r"\b\d{1,2}/\d{1,2}\b|\b\d{4}-\d{2}-\d{2}\b")
+# Horário de relógio ("às 10", "10h", "10:30") = dia relativo + hora fixa ("amanhã 10:00")
+CLOCK_RE = re.compile(r"\b(as|at)\s+\d{1,2}\b|\b\d{1,2}(h|:\d{2})\b")
+# Dia relativo ou período ("amanhã", "hoje à noite"): o LLM escolhe uma hora de relógio, não um deslocamento
+RELATIVE_DAY_RE = re.compile(
+    r"\b(hoje|amanha|depois de amanha|noite|madrugada|meio dia|meia noite|today|tomorrow|tonight)\b"
+)
+
+
+def cache_key(text):
+    """Texto normalizado: minúsculo, sem acentos e sem pontuação."""
+    return " ".join(TOKEN_RE.findall(normalize(text)))
+
+
+class RelativeTime:
+    """Horário guardado de forma simbólica e resolvido contra o relógio no uso."""
+    __slots__ = ("days", "clock", "seconds")
+
+    def __init__(self, days=None, clock=None, seconds=None):
+        self.days = days          # Deslocamento em dias + hora de relógio ("amanhã 10:00")
+        self.clock = clock
+        self.seconds = seconds    # Ou deslocamento puro ("+10 minutes")
+
+    @classmethod
+    def from_absolute(cls, value, now, wall_clock):
+        if wall_clock:
+            return cls(days=(value.date() - now.date()).days, clock=(value.hour, value.minute))
+        return cls(seconds=round((value - now).total_seconds() / 60) * 60)
+
+    def resolve(self, now):
+        if self.seconds is not None:
+            return (now + timedelta(seconds=self.seconds)).replace(second=0, microsecond=0)
+        day = now + timedelta(days=self.days)
+        return day.replace(hour=self.clock[0], minute=self.clock[1], second=0, microsecond=0)
+
+    def __repr__(self):
+        if self.seconds is not None:
+            return f"+{self.seconds // 60} minutes"
+        names = {0: "today", 1: "tomorrow"}
+        return f"{names.get(self.days, f'+{self.days} days')} {self.clock[0]:02d}:{self.clock[1]:02d}"
+
+
+class IntentCache:
+    """
+    Cache LRU com TTL das intenções extraídas pelo LLM, por texto normalizado.
+    Campos de horário (*_time) são guardados relativos ao momento da extração
+    e resolvidos contra o relógio atual a cada uso, então "verifique meus emails"
+    ou "me lembra amanhã às 10" repetidos não pagam o LLM de novo.
+    Os "minutes" de um lembrete ancorado no relógio ("às 15h", "amanhã") viram
+    o horário-alvo e são recalculados no uso; se o horário já passou, é um miss.
+    """
+    def __init__(self, max_size=None, ttl=None):
+        self.max_size = max_size if max_size is not None else int(os.getenv("INTENT_CACHE_SIZE", "512"))
+        self.ttl = ttl if ttl is not None else float(os.getenv("INTENT_CACHE_TTL", "3600"))
+        self._entries = OrderedDict()   # chave -> (expira_em, intenções simbólicas)
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0                # Respostas que não podiam ser cacheadas
+
+    def get(self, text, now):
+        key = cache_key(text)
+        item = self._entries.get(key)
+        if item is None or item[0] < time.monotonic():
+            if item is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        try:
+            intents = self._resolve(item[1], now)
+        except ValueError:
+            # Lembrete para um horário que já passou: o LLM decide de novo
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        logger.debug(f"🗂️ Intenção em cache: {key[:40]}")
+        return intents
+
+    def put(self, text, intents, now):
+        if self.max_size <= 0:
+            return
+        norm = normalize(text)
+        if WEEKDAY_RE.search(norm):
+            self.skipped += 1
+            return
+        wall_clock = bool(CLOCK_RE.search(norm) or RELATIVE_DAY_RE.search(norm))
+        absolute = bool(DATE_RE.search(norm))
+        try:
+            symbolic = [self._symbolize(intent, now, wall_clock, absolute) for intent in intents]
+        except (TypeError, ValueError):
+            self.skipped += 1
+            return
+        key = cache_key(text)
+        self._entries[key] = (time.monotonic() + self.ttl, symbolic)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    @staticmethod
+    def _symbolize(intent, now, wall_clock, absolute):
+        intent = dict(intent)
+        if intent.get("minutes") is not None and (wall_clock or absolute):
+            if absolute:
+                raise ValueError("lembrete para data explícita")  # Deslocamento até uma data fixa: não cacheia
+            # "às 15h" = 47 min agora, 17 min daqui a meia hora: guarda o horário-alvo
+            target = now + timedelta(minutes=float(intent["minutes"]))
+            intent["minutes"] = RelativeTime.from_absolute(target, now, wall_clock=True)
+        if absolute:
+            return intent
+        for field, value in intent.items():
+            if field.endswith("_time") and isinstance(value, str) and value:
+                moment = datetime.fromisoformat(value)
+                if moment.tzinfo is None:
+                    moment = moment.replace(tzinfo=now.tzinfo)
+                intent[field] = RelativeTime.from_absolute(moment.astimezone(now.tzinfo), now, wall_clock)
+        return intent
+
+    @staticmethod
+    def _resolve(intents, now):
+        resolved = []
+        for intent in intents:
+            intent = copy.deepcopy(intent)
+            for field, value in intent.items():
+                if not isinstance(value, RelativeTime):
+                    continue
+                moment = value.resolve(now)
+                if field == "minutes":
+                    minutes = round((moment - now).total_seconds() / 60)
+                    if minutes <= 0:
+                        raise ValueError("horário do lembrete já passou")
+                    intent[field] = minutes
+                else:
+                    intent[field] = moment.isoformat(timespec="seconds")
+            resolved.append(intent)
+        return resolved
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            "size": len(self._entries),
+            "skipped": self.skipped,
+        }
@@ -0,0 +1,193 @@
+import os
+import re
+import math
+import time
+from collections import Counter
+from loguru import logger
+
+from memory_index import TOKEN_RE, normalize
+
+# === PADRÕES (pré-compilados, sobre o texto normalizado: minúsculo e sem acentos) ===
+GREETING_RE = re.compile(
+    r"^(oi+|ola|opa|eai|e ai|fala|bom dia|boa tarde|boa noite|tudo bem|tudo bom|obrigad[oa]|muito obrigad[oa]|"
+    r"valeu|vlw|brigad[oa]|tchau|ate mais|ate logo|ok|okay|beleza|blz|show|massa|top|certo|entendi|"
+    r"hi|hello|hey|thanks|thank you|thx|bye|good morning|good night|cool|nice)"
+    r"( (caio|cara|mano|amigo|parceiro|pessoal))?[\s!.,?]*$"
+)
+# Só o pedido no imperativo ("me lembra", "lembre-me", "lembrete"); "você lembra...?" é conversa
+REMINDER_VERB_RE = re.compile(
+    r"\b(me (lembr[ae]|lembrar|avis[ae]|avisar)|(lembr[ae]|avis[ae])-me|lembrete|remind me|reminder)\b"
+)
+# Qualquer menção a lembrar/avisar: nunca vira "chat" pelo caminho rápido
+REMINDER_WORD_RE = re.compile(r"\b(lembr\w*|avis\w*|remind\w*)\b")
+# Referência ao passado ("há 10 minutos atrás", "o que eu disse"): não é pedido de lembrete
+PAST_RE = re.compile(r"\b(atras|ha \d+|que (eu )?(te )?(disse|falei|falamos)|ago|what i said)\b")
+REMINDER_TIME_RE = re.compile(
+    r"\b(?:em|daqui a|daqui|dentro de|in|after)\s+(\d+|uma?|meia)\s*"
+    r"(minutos?|mins?|m|horas?|hrs?|h|hours?|minutes?)\b"
+)
+EMAIL_RE = re.compile(r"\b(e-?mails?|inbox|caixa de entrada|gmail)\b")
+EMAIL_SEND_RE = re.compile(r"\b(envi\w*|mand\w*|escrev\w*|respond\w*|send|write|reply|deleta\w*|apag\w*|delete)\b")
+# Termos de outras ações: a mensagem precisa do LLM (várias intenções, agenda, busca...)
+COMPLEX_RE = re.compile(
+    r"\b(agend\w*|marc\w*|reuniao|calendario|evento|calendar|meeting|schedule|pesquis\w*|busc\w*|procur\w*|"
+    r"search|google|drive|upload|arquivo|todo dia|todos os dias|diariamente|every day)\b"
+)
+# Negação/cancelamento ("não me lembra", "cancela o lembrete"): o sentido inverte, só o LLM resolve
+NEGATION_RE = re.compile(r"\b(n[ãa]o|cancel\w*|desmarc\w*|esquece|don'?t|stop)\b")
+
+# === MODELO: Naive Bayes multinomial com um conjunto de treino embutido ===
+TRAINING = {
+    "chat": [
+        "oi", "olá caio", "bom dia", "boa noite", "obrigado", "valeu pela ajuda", "tudo bem com você",
+        "como você está", "me conta uma piada", "o que você acha disso", "quem é você", "hello there",
+        "thanks a lot", "how are you", "legal, entendi", "kkkk muito bom", "qual seu nome",
+        "estou cansado hoje", "gostei da resposta", "me explica o que é python",
+    ],
+    "reminder_set": [
+        "me lembra em 10 minutos de ligar pro joão", "me lembre daqui a 5 min de tirar o bolo",
+        "lembrete em 30 minutos beber água", "me avisa em 1 hora da reunião", "remind me in 15 minutes to stretch",
+        "daqui a 20 minutos me lembra de sair", "me lembrar em 2 horas de pagar a conta",
+        "lembra de mim em 5 minutos para tomar remédio", "avise em 45 min pra buscar as crianças",
+        "remind me in 1 hour to call mom", "me lembra em meia hora de checar o forno",
+    ],
+    "email_check": [
+        "tenho emails novos", "checa meus emails", "verifica a caixa de entrada", "tem algum email não lido",
+        "ler meus e-mails", "any new emails", "check my inbox", "quais emails chegaram hoje",
+        "ver emails não lidos", "olha meu gmail", "chegou algum email",
+    ],
+    "other": [
+        "agendar reunião amanhã às 10", "marca um evento sexta às 15h", "pesquise sobre inteligência artificial",
+        "busca o preço do dólar", "envia um email para ana dizendo oi", "manda email pro chefe",
+        "faz upload do relatório no drive", "agenda dentista e me lembra em 1 minuto",
+        "search for python tutorials", "schedule a meeting tomorrow", "send an email to john",
+        "todo dia às 8 me lembre de correr", "procura restaurantes perto de mim", "salva esse arquivo no drive",
+    ],
+}
+
+
+def _features(text):
+    words = TOKEN_RE.findall(normalize(text))
+    return words + [f"{a}_{b}" for a, b in zip(words, words[1:])]
+
+
+class NaiveBayes:
+    """Naive Bayes multinomial minúsculo (palavras + bigramas, suavização de Laplace)."""
+    def __init__(self, examples, alpha=1.0):
+        self.alpha = alpha
+        self.counts = {label: Counter() for label in examples}
+        self.totals = {}
+        self.priors = {}
+        n_docs = sum(len(texts) for texts in examples.values())
+        for label, texts in examples.items():
+            for text in texts:
+                self.counts[label].update(_features(text))
+            self.totals[label] = sum(self.counts[label].values())
+            self.priors[label] = math.log(len(texts) / n_docs)
+        self.vocab = set().union(*self.counts.values())
+
+    def predict(self, text):
+        """Retorna (rótulo, probabilidade) do rótulo mais provável."""
+        feats = [f for f in _features(text) if f in self.vocab]
+        v = len(self.vocab)
+        scores = {}
+        for label, counts in self.counts.items():
+            denom = math.log(self.totals[label] + self.alpha * v)
+            scores[label] = self.priors[label] + sum(math.log(counts[f] + self.alpha) - denom for f in feats)
+        best = max(scores, key=scores.get)
+        top = scores[best]
+        norm = sum(math.exp(s - top) for s in scores.values())
+        return best, 1.0 / norm
+
+
+def parse_minutes(amount, unit):
+    if amount in ("meia",):
+        value = 0.5
+    elif amount in ("um", "uma"):
+        value = 1
+    else:
+        value = int(amount)
+    if unit.startswith("h"):
+        value *= 60
+    return max(1, int(value))
+
+
+class IntentRules:
+    """
+    Pré-classificador local e determinístico na frente do LLM em detect_intent().
+    Padrões pré-compilados extraem os argumentos e o Naive Bayes confirma a intenção;
+    só quando os dois concordam com confiança >= `min_confidence` o LLM é dispensado.
+    Cumprimentos curtos ("oi", "obrigado") viram "chat" direto.
+    """
+    def __init__(self, min_confidence=None):
+        self.min_confidence = min_confidence if min_confidence is not None else float(os.getenv("INTENT_FAST_PATH_MIN_CONFIDENCE", "0.8"))
+        self.model = NaiveBayes(TRAINING)
+        self.calls = 0
+        self.fired = Counter()      # ação -> vezes que o caminho rápido respondeu
+        self.total_us = 0.0
+
+    def classify(self, text):
+        """Retorna a lista de intenções (mesmo formato do LLM) ou None se a confiança é baixa."""
+        start = time.perf_counter()
+        intents = self._classify(text)
+        self.calls += 1
+        self.total_us += (time.perf_counter() - start) * 1e6
+        if intents is not None:
+            self.fired[intents[0]["action"]] += 1
+            logger.debug(f"⚡ Intenção local: {intents[0]['action']}")
+        if self.calls % 100 == 0:
+            logger.info(f"⚡ Caminho rápido de intenções: {self.stats()}")
+        return intents
+
+    def _classify(self, text):
+        norm = normalize(text).strip()
+        if not norm:
+            return None
+        if GREETING_RE.match(norm):
+            return [{"action": "chat"}]
+        if COMPLEX_RE.search(norm) or NEGATION_RE.search(norm):
+            return None
+
+        label, prob = self.model.predict(text)
+        if prob < self.min_confidence:
+            return None
+        if label == "reminder_set":
+            return self._reminder(text, norm)
+        if label == "email_check":
+            if EMAIL_RE.search(norm) and not EMAIL_SEND_RE.search(norm):
+                return [{"action": "email_check", "query": "is:unread"}]
+            return None
+        if label == "chat" and not REMINDER_WORD_RE.search(norm) and not EMAIL_RE.search(norm):
+            return [{"action": "chat"}]
+        return None
+
+    def _reminder(self, text, norm):
+        # Pergunta ou referência ao passado: "você lembra o que eu disse em 5 minutos?"
+        if not REMINDER_VERB_RE.search(norm) or "?" in norm or PAST_RE.search(norm):
+            return None
+        times = REMINDER_TIME_RE.findall(norm)
+        if len(times) != 1:
+            return None  # Sem prazo (ou mais de um): o LLM decide
+        minutes = parse_minutes(*times[0])
+        # A mensagem é o que vem depois do verbo, tirando o prazo (preservando a caixa/acentos do original);
+        # o que vem antes ("oi, ...") só vale se não sobrar nada depois
+        verb = re.search(r"(?i)\b(me\s+)?(lembr\w*|lembrete|avis\w*|remind(\s+me)?|reminder)(-me)?\b", text)
+        before, after = (text[:verb.start()], text[verb.end():]) if verb else ("", text)
+        message = self._clean_message(after) or self._clean_message(before)
+        return [{"action": "reminder_set", "minutes": minutes, "message": message or "Lembrete"}]
+
+    @staticmethod
+    def _clean_message(text):
+        text = re.sub(r"(?i)\b(em|daqui\s+a|daqui|dentro\s+de|in|after)\s+(\d+|uma?|meia)\s*\w+\b", " ", text)
+        text = re.sub(r"\s+", " ", text).strip(" ,.!?:")
+        return re.sub(r"(?i)^\W*(de|da|do|pra|para|que|to)\b", "", text).strip(" ,.!?:")
+
+    def stats(self):
+        fired = sum(self.fired.values())
+        return {
+            "calls": self.calls,
+            "fired": fired,
+            "fire_ratio": round(fired / self.calls, 4) if self.calls else 0.0,
+            "by_action": dict(self.fired),
+            "avg_us": round(self.total_us / self.calls, 1) if self.calls else 0.0,
+        }
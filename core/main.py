@@ -6,8 +6,11 @@ from loguru import logger
 from telegram import Update
 from telegram.ext import ApplicationBuilder, ContextTypes, MessageHandler, filters
 
-from memory import MemorySystem
+from memory import PartitionedMemory
+from memory_writer import MemoryWriter
+from memory_consolidation import MemoryConsolidator, load_summarizer
 from agent import CaioAgent
+from telegram_stream import stream_reply
 from skills.scheduler_skill import SchedulerSkill
 from skills.google_skill import GoogleSkill
 from skills.google_drive_skill import GoogleDriveSkill
@@ -22,6 +25,8 @@ logger.add("logs/core.log", rotation="1 MB", level="INFO")
 
 AGENT_NAME = os.getenv("AGENT_NAME", "Caio")
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+# Respostas de chat em streaming (edições incrementais da mensagem)
+STREAM_REPLIES = os.getenv("TELEGRAM_STREAM", "1") == "1"
 
 # Instâncias Globais
 google_skills = GoogleSkill()
@@ -31,8 +36,12 @@ doc_skill = DocumentProcessorSkill()
 weather_skill = WeatherSkill()
 web_skill = WebSkill()
 fs_skill = FileSystemSkill()
-brain_memory = MemorySystem()
+brain_memory = PartitionedMemory()  # Uma memória por chat (carregada sob demanda)
+memory_writer = MemoryWriter()      # Persistência em segundo plano (nunca bloqueia o loop)
 caio_persona = CaioAgent()
+# Consolidação periódica: memórias antigas viram resumos "semantic" (0 desliga)
+CONSOLIDATE_EVERY_MIN = int(os.getenv("MEMORY_CONSOLIDATE_EVERY_MIN", "360"))
+memory_consolidator = MemoryConsolidator(load_summarizer(os.getenv("MEMORY_SUMMARIZER", "llm"), llm=caio_persona.background_llm))
 scheduler_skill = None
 app_instance = None
 
@@ -55,7 +64,7 @@ class ProactiveMonitor:
             await asyncio.sleep(60)
             if not self.user_chat_id: continue
             try:
-                events = google_skills.get_upcoming_raw()
+                events = await asyncio.to_thread(google_skills.get_upcoming_raw)
                 now = datetime.now(timezone.utc)
                 for evt in events:
                     start_str = evt['start'].get('dateTime')
@@ -74,20 +83,51 @@ class ProactiveMonitor:
 
 monitor = ProactiveMonitor()
 
+async def consolidate_memories():
+    """Consolida as memórias dos chats ativos (roda pelo scheduler, fora do caminho das mensagens)."""
+    for chat_id in brain_memory.active_chats():
+        async with brain_memory.lease(chat_id) as chat_memory:
+            await memory_consolidator.consolidate(chat_memory)
+
 async def post_init(application):
     global scheduler_skill, app_instance
     app_instance = application
     scheduler_skill = SchedulerSkill(send_telegram_message_callback)
     scheduler_skill.start(asyncio.get_running_loop())
+    memory_writer.start()
+    brain_memory.attach_writer(memory_writer)
+    if CONSOLIDATE_EVERY_MIN > 0:
+        scheduler_skill.run_periodic(CONSOLIDATE_EVERY_MIN, consolidate_memories, name="consolidação da memória")
     asyncio.create_task(monitor.loop(application.bot))
 
+async def post_shutdown(application):
+    # Flush final da memória antes de sair
+    await memory_writer.stop()
+    logger.info(f"🧠 Cache de recall (chats ativos): {brain_memory.cache_stats()}")
+    logger.info(f"🚦 Limitador da Groq: {caio_persona.rate_limiter.stats()}")
+    brain_memory.close()
+
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_text = update.message.text
     chat_id = update.effective_chat.id
     monitor.user_chat_id = chat_id
-    
-    brain_memory.store(user_text, source="telegram")
-    intents = caio_persona.detect_intent(user_text)
+    # Emprestada até o fim da resposta: a partição não sai da RAM enquanto está em uso
+    async with brain_memory.lease(chat_id) as chat_memory:
+        await respond(update, chat_id, chat_memory)
+
+async def respond(update, chat_id, chat_memory):
+    user_text = update.message.text
+    await chat_memory.astore(user_text, source="telegram")
+    context_data = None
+    reply_stream = None
+    if caio_persona.single_call:
+        # Memórias antes: uma só chamada ao LLM decide as ações e já responde o chat
+        context_data = await chat_memory.arecall(user_text)
+        if STREAM_REPLIES:
+            intents, reply_stream = await caio_persona.astream_plan(user_text, context_data)
+        else:
+            intents = await caio_persona.aplan_and_respond(user_text, context_data)
+    else:
+        intents = await caio_persona.adetect_intent(user_text)
     
     for intent in intents:
         action = intent.get("action")
@@ -98,32 +138,47 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 response_text = scheduler_skill.set_reminder(chat_id, intent.get("minutes"), intent.get("message"))
             
             elif action == "google_calendar_add":
-                success, msg = google_skills.create_event(intent.get("summary"), intent.get("start_time"), intent.get("end_time"), intent.get("description", ""))
+                success, msg = await asyncio.to_thread(google_skills.create_event, intent.get("summary"), intent.get("start_time"), intent.get("end_time"), intent.get("description", ""))
                 response_text = f"✅ {msg}" if success else f"❌ {msg}"
 
             elif action == "email_check":
                 # Chama o método de listagem de e-mails não lidos
-                response_text = google_skills.list_unread_emails()
+                response_text = await asyncio.to_thread(google_skills.list_unread_emails)
 
             elif action == "brave_search":
-                results = brave_skill.search(intent.get("query"))
-                response_text = caio_persona.generate_message(f"Resultados: {results}", [])
+                query = intent.get("query")
+                results = await asyncio.to_thread(brave_skill.search, query)
+                results_text = caio_persona.budget.pack_results(results, query)
+                response_text = await caio_persona.agenerate_message(f"Resultados da busca por \"{query}\":\n{results_text}", [], cacheable=False)
 
             elif action == "chat":
-                context_data = brain_memory.recall(user_text)
-                response_text = caio_persona.generate_message(user_text, context_data)
+                response_text = intent.get("reply")
+                if not response_text:
+                    if context_data is None:
+                        context_data = await chat_memory.arecall(user_text)
+                    if STREAM_REPLIES:
+                        chunks = reply_stream or caio_persona.astream_message(user_text, context_data)
+                        reply_stream = None
+                        final_msg = await stream_reply(update.message, chunks)
+                        await chat_memory.astore(final_msg, source="caio_response")
+                        continue
+                    response_text = await caio_persona.agenerate_message(user_text, context_data)
             
             if response_text:
                 # Limpeza final de segurança para Telegram
                 final_msg = response_text.replace("**", "*")
                 await update.message.reply_text(final_msg, parse_mode="Markdown")
-                brain_memory.store(final_msg, source="caio_response")
+                await chat_memory.astore(final_msg, source="caio_response")
         
         except Exception as e:
             logger.error(f"Erro ao processar {action}: {e}")
             await update.message.reply_text(f"⚠️ Tive um problema ao processar: {action}")
 
+    if reply_stream is not None:
+        await reply_stream.aclose()  # Resposta em streaming não usada: libera a chamada ao LLM
+
 if __name__ == "__main__":
-    app = ApplicationBuilder().token(TELEGRAM_TOKEN).post_init(post_init).build()
+    # concurrent_updates: um chat esperando o LLM não segura as mensagens dos outros
+    app = ApplicationBuilder().token(TELEGRAM_TOKEN).concurrent_updates(True).post_init(post_init).post_shutdown(post_shutdown).build()
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
     app.run_polling()
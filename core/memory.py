@@ -1,94 +1,670 @@
 import os
-import json
 import time
+import math
+import heapq
+import shutil
+import asyncio
+import itertools
+from contextlib import asynccontextmanager
+from collections import Counter, OrderedDict
 from loguru import logger
 
+from memory_store import make_store
+from memory_index import InvertedIndex, tokenize
+from memory_archive import MemoryArchive
+from memory_cache import RecallCache
+from memory_dedup import NearDuplicateIndex, simhash
+from memory_log import EpisodicLog, format_date
+import vector_memory
+
+MAX_EPISODIC = 1000     # Capacidade da camada quente (RAM)
+ARCHIVE_BLOCK = 200     # Quantas memórias antigas vão juntas para cada segmento do arquivo
+
+# Pesos do ranking híbrido (relevância BM25 + importância + recência)
+RANK_WEIGHTS = {"relevance": 0.7, "importance": 0.1, "recency": 0.2}
+RECENCY_HALF_LIFE = 7 * 24 * 3600   # Uma memória de 7 dias vale metade de uma de agora
+VECTOR_MIN_SCORE = 0.15             # Cosseno mínimo para uma memória contar como lembrança
+
 class MemorySystem:
     """
     Sistema de Memória Local Híbrido (JSON-based).
     Substitui o Supabase temporariamente para garantir robustez local ("Runs on your machine").
+    Por padrão grava num diário append-only (custo de escrita constante) com snapshots periódicos.
     """
-    def __init__(self, file_path="brain_data.json"):
+    def __init__(self, file_path="brain_data.json", storage=None, snapshot_every=None, fsync=None,
+                 recall_mode=None, embedder=None, lazy_load=None):
         self.file_path = file_path
         self.data = {
             "profile": {},       # Preferências (Cidade, Nome, etc.)
-            "episodic": []       # Histórico de conversas/fatos
+            "episodic": EpisodicLog()   # Histórico de conversas/fatos (colunar)
         }
+        # "journal" (padrão): diário append-only + snapshots | "json": reescrita completa
+        # "sqlite": banco WAL com FTS5 (memórias ficam no disco, sem limite de 1000)
+        self.storage_mode = storage or os.getenv("MEMORY_STORAGE", "journal")
+        self.backend = make_store(
+            self.storage_mode,
+            file_path,
+            snapshot_every=snapshot_every or int(os.getenv("MEMORY_SNAPSHOT_EVERY", "500")),
+            fsync=fsync if fsync is not None else os.getenv("MEMORY_FSYNC", "0") == "1"
+        )
+        # O backend SQLite guarda e busca as memórias episódicas ele mesmo
+        self.external = getattr(self.backend, "owns_episodic", False)
+        # Camada fria: memórias que saem da RAM vão para segmentos comprimidos no disco
+        self.archive = None
+        if not self.external and os.getenv("MEMORY_ARCHIVE", "1") == "1":
+            self.archive = MemoryArchive(os.path.splitext(file_path)[0] + "_archive")
+        # "bm25" (padrão): ranking por relevância | "recent": mais recentes primeiro
+        # "vector": busca semântica local (NumPy)
+        self.recall_mode = recall_mode or os.getenv("MEMORY_RECALL_MODE", "bm25")
+        self.vectors = None
+        if self.recall_mode == "vector":
+            if self.external:
+                logger.warning("⚠️ Recall vetorial não suportado no SQLite: usando BM25 (FTS5).")
+                self.recall_mode = "bm25"
+            elif vector_memory.np is None:
+                logger.warning("⚠️ NumPy não instalado: usando recall BM25 no lugar do vetorial.")
+                self.recall_mode = "bm25"
+            else:
+                self._embedder = embedder or vector_memory.load_embedder(os.getenv("MEMORY_EMBEDDER", "hashing"))
+        self.index = InvertedIndex()
+        self._base_id = 0     # id global de episodic[0]
+        self.recall_cache = RecallCache(int(os.getenv("MEMORY_RECALL_CACHE", "256")))
+        # Quase-duplicatas (SimHash + LSH) viram reforço da memória existente
+        self.dedup_enabled = not self.external and os.getenv("MEMORY_DEDUP", "1") == "1"
+        self.dedup = NearDuplicateIndex()
+        # Escritor de fundo (MemoryWriter); sem ele cada alteração vai direto para o disco
+        self.writer = None
+        # Carga preguiçosa: o perfil vale na hora; as memórias episódicas do snapshot
+        # entram em páginas (task de fundo) ou de uma vez no primeiro recall
+        self.lazy_load = lazy_load if lazy_load is not None else os.getenv("MEMORY_LAZY_LOAD", "1") == "1"
+        self.load_page = int(os.getenv("MEMORY_LOAD_PAGE", "500"))
+        self.loaded = True
+        self._entries = None      # Gerador de memórias do snapshot ainda não lidas
+        self._deferred = []       # store/merge que chegaram antes do fim da carga
+        self._load_task = None
         self.load()
 
     def load(self):
-        if os.path.exists(self.file_path):
-            try:
-                with open(self.file_path, 'r', encoding='utf-8') as f:
-                    self.data = json.load(f)
-                # Garante estrutura
-                if "profile" not in self.data: self.data["profile"] = {}
-                if "episodic" not in self.data: self.data["episodic"] = []
-            except Exception as e:
-                logger.error(f"Erro ao carregar memória: {e}")
+        reader = None
+        if self.lazy_load and hasattr(self.backend, "load_lazy"):
+            data, reader, ops = self.backend.load_lazy()
+        else:
+            data, ops = self.backend.load()
+        if data:
+            self.data = data
+        # Garante estrutura
+        if "profile" not in self.data: self.data["profile"] = {}
+        if not isinstance(self.data.get("episodic"), EpisodicLog):
+            self.data["episodic"] = EpisodicLog.from_dicts(self.data.get("episodic") or [])
+        self._rebuild_index()
+        if reader is not None:
+            self.loaded = False
+            self._entries = reader.entries()
+            self._load_started = time.perf_counter()
+            logger.info("🧠 Perfil carregado; memórias episódicas em carga preguiçosa")
+        # Re-aplica o diário sobre o snapshot (store/merge esperam a carga terminar)
+        for op in ops:
+            self._apply(op)
+        if ops:
+            logger.info(f"🧠 Diário re-aplicado: {len(ops)} operações")
 
-    def save(self):
+    def _load_step(self, max_entries):
+        """Lê até `max_entries` memórias do snapshot. Retorna True quando a carga terminou."""
+        if self.loaded:
+            return True
+        episodic = self.data["episodic"]
+        done = False
+        count = 0
         try:
-            with open(self.file_path, 'w', encoding='utf-8') as f:
-                json.dump(self.data, f, ensure_ascii=False, indent=2)
+            for entry in itertools.islice(self._entries, max_entries):
+                self._index_entry(self._base_id + len(episodic), entry["content"])
+                episodic.append(entry)
+                count += 1
+            done = count < max_entries
         except Exception as e:
-            logger.error(f"Erro ao salvar memória: {e}")
+            logger.error(f"Erro ao carregar memórias do snapshot: {e}")
+            done = True
+        if done:
+            self._finish_load()
+        return done
+
+    def _finish_load(self):
+        self._entries.close()
+        self._entries = None
+        self.loaded = True
+        deferred, self._deferred = self._deferred, []
+        for op in deferred:
+            self._apply(op)
+        logger.info(f"🧠 {len(self.data['episodic'])} memórias carregadas em "
+                    f"{time.perf_counter() - self._load_started:.2f}s")
+        # O que ficou retido durante a carga (snapshot, arquivo JSON) pode ir para o disco
+        if self.writer is not None:
+            self.writer.mark_dirty(self)
+
+    def ensure_loaded(self):
+        """Termina a carga preguiçosa de uma vez (recall síncrono, save, close)."""
+        while not self._load_step(self.load_page):
+            pass
+
+    def start_background_load(self):
+        """Agenda a carga das memórias em páginas no event loop atual (sem bloquear respostas)."""
+        if not self.loaded and self._load_task is None:
+            self._load_task = asyncio.get_running_loop().create_task(self._aload())
+
+    async def _aload(self):
+        while not self._load_step(self.load_page):
+            await asyncio.sleep(0)
+
+    async def aensure_loaded(self):
+        if self.loaded:
+            return
+        self.start_background_load()
+        await self._load_task
+
+    def save(self):
+        """Grava o estado completo no disco (snapshot)."""
+        self.ensure_loaded()
+        if self.archive is not None:
+            self.archive.flush()
+        self.backend.snapshot(self.data)
+
+    def close(self):
+        """Grava o que estiver pendente e compacta o diário num snapshot final."""
+        self.ensure_loaded()
+        if self.archive is not None:
+            self.archive.flush()
+        self.backend.close(self.data)
+
+    def attach_writer(self, writer):
+        """Passa a persistência para o escritor de fundo (flush coalescido fora do event loop)."""
+        self.writer = writer
+
+    def prepare_flush(self):
+        """
+        Captura (no event loop) o que precisa ir para o disco e devolve um job de I/O, ou None.
+        O arquivo frio é gravado antes do snapshot que registra as memórias como arquivadas.
+        """
+        # Durante a carga preguiçosa o estado em RAM está incompleto: nada de snapshot
+        backend_job = self.backend.prepare_flush(self.data, snapshot_ok=self.loaded)
+        archive_pending = self.archive is not None and self.archive.has_pending()
+        if not backend_job and not archive_pending:
+            return None
+
+        def job():
+            if archive_pending:
+                self.archive.flush()
+            if backend_job:
+                backend_job()
+        return job
+
+    def flush(self):
+        job = self.prepare_flush()
+        if job:
+            job()
+
+    def _rebuild_index(self):
+        self.index = InvertedIndex()
+        self.dedup = NearDuplicateIndex()
+        self._base_id = self.data.get("archived", 0)
+        if self.recall_mode == "vector":
+            self.vectors = vector_memory.VectorMemory(self._embedder)
+        for doc_id, content in enumerate(self.data["episodic"].contents, self._base_id):
+            self.index.add(doc_id, content)
+            if self.dedup_enabled:
+                self.dedup.add(doc_id, simhash(content))
+        if self.vectors:
+            episodic = self.data["episodic"]
+            self.vectors.add_many(list(range(self._base_id, self._base_id + len(episodic))),
+                                  episodic.contents)
+
+    def _index_entry(self, doc_id, content):
+        self.index.add(doc_id, content)
+        if self.dedup_enabled:
+            self.dedup.add(doc_id, simhash(content))
+        if self.vectors:
+            self.vectors.add(doc_id, content)
+
+    def _apply(self, op):
+        """Aplica uma operação ao estado em memória (usado no fluxo normal e no replay)."""
+        kind = op.get("op")
+        if kind != "pref" and not self.loaded:
+            self._deferred.append(op)  # Aplicada na ordem quando o snapshot terminar de carregar
+            return
+        if kind == "pref":
+            self.data["profile"][op["key"]] = op["value"]
+        elif kind == "store":
+            self.recall_cache.invalidate(tokenize(op["entry"]["content"]))
+            if not self.external:
+                self._append(op["entry"])
+        elif kind == "merge":
+            if op["id"] < self._base_id:
+                return  # Já foi para o arquivo frio (imutável)
+            pos = op["id"] - self._base_id
+            episodic = self.data["episodic"]
+            episodic.touch(pos, op["importance"], op["timestamp"])
+            self.recall_cache.invalidate(tokenize(episodic.contents[pos]))
+        elif kind == "compact":
+            # Consolidação: as memórias com id < upto já foram resumidas e vão para o arquivo
+            count = op["upto"] - self._base_id
+            if count > 0 and not self.external:
+                self._evict_oldest(min(count, len(self.data["episodic"])), skip_ids=op.get("skip"))
+
+    def _append(self, entry):
+        """Adiciona na camada quente e nos índices."""
+        episodic = self.data["episodic"]
+        self._index_entry(self._base_id + len(episodic), entry["content"])
+        episodic.append(entry)
+        # Camada quente limitada: as mais antigas saem em blocos para o arquivo
+        if len(episodic) > MAX_EPISODIC:
+            excess = len(episodic) - MAX_EPISODIC
+            self._evict_oldest(max(excess, ARCHIVE_BLOCK) if self.archive is not None else excess)
+
+    def _evict_oldest(self, count, skip_ids=None):
+        """
+        Move as `count` memórias mais antigas para o arquivo frio, limpando seus postings.
+        As de id em `skip_ids` saem da camada quente sem ir para o arquivo
+        (a consolidação as grava de novo no fim do histórico).
+        """
+        episodic = self.data["episodic"]
+        if self.archive is not None:
+            block = episodic.slice_dicts(0, count)
+            if not skip_ids:
+                self.archive.append(self._base_id, block)
+            else:
+                skip_ids = set(skip_ids)
+                kept = [(self._base_id + i, mem) for i, mem in enumerate(block) if self._base_id + i not in skip_ids]
+                self.archive.append(self._base_id, [mem for _, mem in kept], ids=[doc_id for doc_id, _ in kept],
+                                    last_id=self._base_id + count - 1)
+        for i in range(count):
+            self.index.remove_oldest(self._base_id + i, episodic.contents[i])
+            self.dedup.remove(self._base_id + i)
+            # O ranking dessas consultas muda quando a memória vai para a camada fria
+            self.recall_cache.invalidate(tokenize(episodic.contents[i]))
+        episodic.drop_oldest(count)
+        self._base_id += count
+        self.data["archived"] = self._base_id
+        if self.vectors:
+            self.vectors.remove_oldest(count)
+
+    def _commit(self, op, flush=True):
+        self._apply(op)
+        self.backend.record(op, self.data)
+        if self.writer is not None:
+            self.writer.mark_dirty(self)
+        elif flush:
+            self.flush()
 
     # === PREFERÊNCIAS (PERFIL) ===
-    def set_preference(self, key, value):
+    def set_preference(self, key, value, flush=True):
         """Salva um dado estruturado do usuário (ex: city: Salvador)."""
-        self.data["profile"][key] = value
-        self.save()
+        self._commit({"op": "pref", "key": key, "value": value}, flush=flush)
         logger.success(f"🧠 Perfil Atualizado: {key} = {value}")
 
     def get_preference(self, key, default=None):
         return self.data["profile"].get(key, default)
 
     # === MEMÓRIA EPISÓDICA (BUSCA) ===
-    def store(self, content, source="chat", importance=1):
-        """Guarda uma memória episódica."""
+    def store(self, content, source="chat", importance=1, flush=True, timestamp=None):
+        """
+        Guarda uma memória episódica.
+        Se já existe uma quase-duplicata recente da mesma origem, ela é reforçada
+        (importância +1 e timestamp renovado) em vez de criar uma entrada nova.
+        `timestamp` permite datar a memória no passado (resumos da consolidação).
+        """
+        # Durante a carga preguiçosa o índice está incompleto: a deduplicação espera
+        if self.dedup_enabled and self.loaded:
+            doc_id = self.dedup.find(
+                simhash(content),
+                accept=lambda d: self.data["episodic"].sources[d - self._base_id] == source
+            )
+            if doc_id is not None:
+                mem = self._mem(doc_id)
+                self._commit({
+                    "op": "merge",
+                    "id": doc_id,
+                    "importance": min(max(mem.get("importance", 1), importance) + 1, 10),
+                    "timestamp": max(mem["timestamp"], timestamp or time.time())
+                }, flush=flush)
+                logger.debug(f"♻️ Memória reforçada (quase-duplicata): {content[:30]}...")
+                return True
+
         entry = {
             "content": content,
             "source": source,
             "importance": importance,
-            "timestamp": time.time(),
-            "date": time.strftime("%Y-%m-%d %H:%M:%S")
+            "timestamp": timestamp or time.time()
         }
-        self.data["episodic"].append(entry)
-        # Mantém apenas as últimas 1000 memórias para não explodir o JSON
-        if len(self.data["episodic"]) > 1000:
-            self.data["episodic"] = self.data["episodic"][-1000:]
-            
-        self.save()
+        self._commit({"op": "store", "entry": entry}, flush=flush)
         logger.debug(f"💾 Memória salva: {content[:30]}...")
         return True
 
+    def compact(self, upto_id, skip_ids=None, flush=True):
+        """
+        Tira da camada quente as memórias com id global < upto_id (já consolidadas).
+        As de id em `skip_ids` não vão para o arquivo frio.
+        """
+        op = {"op": "compact", "upto": upto_id}
+        if skip_ids:
+            op["skip"] = sorted(skip_ids)
+        self._commit(op, flush=flush)
+
     def recall(self, query, limit=5):
         """
-        Recuperação simples baseada em palavras-chave (Keyword Matching).
-        Para um sistema local avançado, usaríamos ChromaDB ou FAISS aqui depois.
+        Recuperação via índice invertido (palavras-chave) ou vetorial (semântica).
+        Só percorre os candidatos da busca (não o histórico inteiro).
         """
-        query_terms = query.lower().split()
+        self.ensure_loaded()
+        terms, cache_key, version, cached = self._recall_start(query, limit)
+        if cached is not None:
+            return cached
+        ranked = self._rank_hot(query, terms, limit)
+        if self._needs_cold(ranked, limit):
+            ranked += self._rank_cold(terms, limit - len(ranked))
+        return self._recall_finish(cache_key, version, ranked)
+
+    # === FACHADA ASSÍNCRONA ===
+    async def astore(self, content, source="chat", importance=1):
+        """store() sem I/O no event loop: com writer ele grava depois; sem writer, numa thread."""
+        result = self.store(content, source, importance, flush=False)
+        await self._aflush_if_unattached()
+        return result
+
+    async def aset_preference(self, key, value):
+        self.set_preference(key, value, flush=False)
+        await self._aflush_if_unattached()
+
+    async def arecall(self, query, limit=5):
+        """recall() com a parte que toca o disco (arquivo frio, SQLite) numa thread."""
+        await self.aensure_loaded()
+        terms, cache_key, version, cached = self._recall_start(query, limit)
+        if cached is not None:
+            return cached
+        ranked = self._rank_hot(query, terms, limit)
+        if self._needs_cold(ranked, limit):
+            ranked += await asyncio.to_thread(self._rank_cold, terms, limit - len(ranked))
+        return self._recall_finish(cache_key, version, ranked)
+
+    async def _aflush_if_unattached(self):
+        if self.writer is None:
+            job = self.prepare_flush()
+            if job:
+                await asyncio.to_thread(job)
+
+    def _recall_start(self, query, limit):
+        terms = tokenize(query)
+        cache_key = RecallCache.make_key(terms, limit)
+        cached = self.recall_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"🧠 Memórias recuperadas (cache): {len(cached)}")
+        if self.recall_cache.max_size > 0 and (self.recall_cache.hits + self.recall_cache.misses) % 100 == 0:
+            logger.info(f"🧠 Cache de recall: {self.cache_stats()}")
+        version = self.recall_cache.version
+        if self.external and self.backend.has_pending():
+            version = -1  # O SQLite ainda não tem as últimas memórias: não cachear este resultado
+        return terms, cache_key, version, cached
+
+    def _rank_hot(self, query, terms, limit):
+        """Ranking na camada quente (RAM)."""
+        if self.external:
+            return []
+        if self.recall_mode == "recent":
+            hits = self.index.candidates(terms)
+            # Mais recentes primeiro (por timestamp: memórias reforçadas sobem)
+            timestamps = self.data["episodic"].timestamps
+            newest = heapq.nlargest(limit, hits, key=lambda d: timestamps[d - self._base_id])
+            return [(self._mem(doc_id), hits[doc_id]) for doc_id in newest]
+        if self.recall_mode == "vector":
+            return self._rank_vector(query, limit)
+        return self._rank_bm25(terms, limit)
+
+    def _needs_cold(self, ranked, limit):
+        # Camada fria só é consultada se a quente não bastou
+        if self.external:
+            return True
+        return self.archive is not None and len(ranked) < limit and bool(self.archive.segments)
+
+    def _rank_cold(self, terms, limit):
+        """Busca no disco (SQLite ou arquivo frio); pode rodar fora do event loop."""
+        if self.external:
+            return self._rank_external(terms, limit)
+        return self._rank_archive(terms, limit)
+
+    def _recall_finish(self, cache_key, version, ranked):
         results = []
-        
-        # Busca reversa (mais recentes primeiro)
-        for mem in reversed(self.data["episodic"]):
-            score = 0
-            content_lower = mem["content"].lower()
-            
-            for term in query_terms:
-                if term in content_lower:
-                    score += 1
-            
-            if score > 0:
-                results.append({
-                    "content": mem["content"],
-                    "similarity": score, # Mock de score
-                    "created_at": mem["date"]
-                })
-                
-            if len(results) >= limit:
-                break
-                
+        for mem, score in ranked:
+            results.append({
+                "content": mem["content"],
+                "similarity": score,
+                "created_at": mem.get("date") or format_date(mem["timestamp"])
+            })
+
+        self.recall_cache.put(cache_key, results, version=version)
         logger.info(f"🧠 Memórias recuperadas: {len(results)}")
         return results
+
+    def cache_stats(self):
+        """Contadores do cache de recall (hits, misses, hit_ratio, size, invalidations)."""
+        return self.recall_cache.stats()
+
+    def _mem(self, doc_id):
+        return self.data["episodic"].get(doc_id - self._base_id)
+
+    def _rank_bm25(self, terms, limit):
+        """BM25 normalizado misturado com importância e recência."""
+        scores = self.index.bm25(terms)
+        if not scores:
+            return []
+        # Pré-corte pelo BM25: a mistura só reordena os melhores candidatos
+        top = heapq.nlargest(max(limit * 20, 200), scores.items(), key=lambda kv: kv[1])
+        return self._blend([(self._mem(doc_id), score) for doc_id, score in top], limit)
+
+    def _rank_vector(self, query, limit):
+        """Vizinhos mais próximos por cosseno, misturados com importância e recência."""
+        top = [(self._mem(doc_id), score) for doc_id, score in self.vectors.search(query, max(limit * 20, 200))
+               if score >= VECTOR_MIN_SCORE]
+        return self._blend(top, limit) if top else []
+
+    def _rank_archive(self, terms, limit):
+        hits = self.archive.search(terms, limit, below_id=self._base_id)
+        if self.recall_mode == "recent" or not hits:
+            return hits[:limit]
+        return self._blend(hits, limit)
+
+    def _rank_external(self, terms, limit):
+        """Busca delegada ao backend (FTS5 no SQLite)."""
+        if self.recall_mode == "recent":
+            query_terms = set(terms)
+            return [(mem, len(query_terms & set(tokenize(mem["content"]))))
+                    for mem, _ in self.backend.search(terms, limit, mode="recent")]
+        top = self.backend.search(terms, max(limit * 20, 200), mode="bm25")
+        return self._blend(top, limit) if top else []
+
+    def _blend(self, top, limit):
+        """Mistura o score de relevância (normalizado pelo melhor) com importância e recência."""
+        # Pelo máximo, não pelo primeiro: o arquivo frio devolve os candidatos por recência
+        best = max(score for _, score in top) or 1.0
+        now = time.time()
+        w = RANK_WEIGHTS
+
+        blended = []
+        for mem, score in top:
+            importance = min(mem.get("importance") or 1, 10) / 10
+            age = max(now - (mem.get("timestamp") or now), 0)
+            recency = math.pow(0.5, age / RECENCY_HALF_LIFE)
+            final = w["relevance"] * score / best + w["importance"] * importance + w["recency"] * recency
+            blended.append((mem, round(final, 4)))
+
+        return heapq.nlargest(limit, blended, key=lambda kv: kv[1])
+
+
+class PartitionedMemory:
+    """
+    Memória particionada por chat_id: cada chat tem perfil, histórico e índices próprios.
+    As partições são abertas sob demanda e as menos usadas saem da RAM (LRU),
+    então o custo de memória/recall acompanha os usuários ativos, não o total.
+    No código assíncrono as partições são usadas por empréstimo (lease()): uma
+    partição emprestada nunca é descarregada, mesmo acima de `max_active`.
+    """
+    def __init__(self, base_dir=None, max_active=None, legacy_file="brain_data.json", owner_chat_id=None, **memory_kwargs):
+        self.base_dir = base_dir or os.getenv("MEMORY_PARTITION_DIR", "brain_chats")
+        self.max_active = max_active or int(os.getenv("MEMORY_MAX_ACTIVE_CHATS", "32"))
+        self.legacy_file = legacy_file
+        # O brain_data.json antigo (memória global) é herdado pelo dono do bot
+        self.owner_chat_id = str(owner_chat_id or os.getenv("ALLOWED_USER_ID", ""))
+        self.memory_kwargs = memory_kwargs
+        self._active = OrderedDict()   # chat_id -> MemorySystem
+        self._loading = {}             # chat_id -> Future (carregamento assíncrono em andamento)
+        self._closing = {}             # chat_id -> Future (descarga em andamento)
+        self._leases = Counter()       # chat_id -> empréstimos em uso
+        self.writer = None
+        os.makedirs(self.base_dir, exist_ok=True)
+        legacy_base = os.path.splitext(legacy_file)[0]
+        if not self.owner_chat_id and any(os.path.exists(legacy_base + ext) for ext in (".json", ".journal", ".db")):
+            logger.warning(f"⚠️ ALLOWED_USER_ID vazio: a memória antiga {legacy_file} não será atribuída a nenhum chat.")
+
+    def attach_writer(self, writer):
+        """Todas as partições (atuais e futuras) passam a gravar pelo escritor de fundo."""
+        self.writer = writer
+        for memory in self._active.values():
+            memory.attach_writer(writer)
+
+    def _path(self, chat_id):
+        return os.path.join(self.base_dir, f"{chat_id}.json")
+
+    def _adopt_legacy(self, chat_id, path):
+        """Copia a memória global antiga (snapshot, diário e arquivo frio) para a partição do dono."""
+        if str(chat_id) != self.owner_chat_id:
+            return
+        legacy_base = os.path.splitext(self.legacy_file)[0]
+        target_base = os.path.splitext(path)[0]
+        if any(os.path.exists(target_base + ext) for ext in (".json", ".journal", ".db")):
+            return
+        copied = False
+        for ext in (".json", ".journal", ".db"):
+            if os.path.exists(legacy_base + ext):
+                shutil.copy2(legacy_base + ext, target_base + ext)
+                copied = True
+        if os.path.isdir(legacy_base + "_archive"):
+            shutil.copytree(legacy_base + "_archive", target_base + "_archive")
+        if copied:
+            logger.success(f"🧠 Memória global antiga atribuída ao chat {chat_id}")
+
+    def for_chat(self, chat_id):
+        """Retorna a MemorySystem do chat, carregando sob demanda (uso síncrono, sem event loop)."""
+        key = str(chat_id)
+        memory = self._active.get(key)
+        if memory is not None:
+            self._active.move_to_end(key)
+            return memory
+        memory = self._activate(key, self._open(key))
+        for old_key in self._evictable():
+            self._active.pop(old_key).close()
+            logger.debug(f"💤 Memória do chat {old_key} descarregada da RAM")
+        return memory
+
+    @asynccontextmanager
+    async def lease(self, chat_id):
+        """
+        Empresta a MemorySystem do chat enquanto o bloco roda:
+            async with memory.lease(chat_id) as chat_memory: ...
+        A leitura do disco de uma partição nova roda numa thread.
+        """
+        key = str(chat_id)
+        memory = await self._acquire(key)
+        try:
+            yield memory
+        finally:
+            self._leases[key] -= 1
+            if self._leases[key] <= 0:
+                del self._leases[key]
+            await self._evict_idle()
+
+    async def _acquire(self, key):
+        while True:
+            closing = self._closing.get(key)
+            if closing is not None:
+                await closing   # Mesma partição sendo descarregada: reabre só depois de gravada
+                continue
+            memory = self._active.get(key)
+            if memory is not None:
+                self._active.move_to_end(key)
+                self._leases[key] += 1
+                return memory
+            pending = self._loading.get(key)
+            if pending is not None:
+                await pending
+                continue
+            break
+        future = asyncio.get_running_loop().create_future()
+        self._loading[key] = future
+        try:
+            memory = self._activate(key, await asyncio.to_thread(self._open, key))
+            self._leases[key] += 1
+            memory.start_background_load()
+            future.set_result(memory)
+            return memory
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Quem espera no _acquire() tenta de novo; evita aviso de exceção não lida
+            raise
+        finally:
+            del self._loading[key]
+
+    def _open(self, key):
+        path = self._path(key)
+        self._adopt_legacy(key, path)
+        return MemorySystem(path, **self.memory_kwargs)
+
+    def _activate(self, key, memory):
+        if self.writer is not None:
+            memory.attach_writer(self.writer)
+        self._active[key] = memory
+        return memory
+
+    def _evictable(self):
+        """Partições a descarregar: as menos usadas acima do limite, pulando as emprestadas."""
+        excess = len(self._active) - self.max_active
+        if excess <= 0:
+            return []
+        return [key for key in self._active if not self._leases.get(key)][:excess]
+
+    async def _evict_idle(self):
+        while True:
+            # Recalcula a cada volta: durante o close() anterior a partição pode ter sido emprestada de novo
+            victims = self._evictable()
+            if not victims:
+                break
+            key = victims[0]
+            memory = self._active.pop(key)
+            done = asyncio.get_running_loop().create_future()
+            self._closing[key] = done
+            try:
+                if self.writer is not None:
+                    await self.writer.detach(memory)
+                await asyncio.to_thread(memory.close)
+                logger.debug(f"💤 Memória do chat {key} descarregada da RAM")
+            except Exception as e:
+                logger.error(f"Erro ao descarregar a memória do chat {key}: {e}")
+            finally:
+                del self._closing[key]
+                done.set_result(None)
+
+    def active_chats(self):
+        return list(self._active)
+
+    def cache_stats(self):
+        """Contadores do cache de recall somados entre as partições ativas."""
+        totals = {"hits": 0, "misses": 0, "size": 0, "invalidations": 0}
+        for memory in self._active.values():
+            for name, value in memory.cache_stats().items():
+                if name in totals:
+                    totals[name] += value
+        lookups = totals["hits"] + totals["misses"]
+        totals["hit_ratio"] = round(totals["hits"] / lookups, 4) if lookups else 0.0
+        return totals
+
+    def close(self):
+        """Grava e fecha todas as partições ativas."""
+        while self._active:
+            _, memory = self._active.popitem(last=False)
+            memory.close()
@@ -0,0 +1,186 @@
+import os
+import gzip
+import json
+import math
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+from loguru import logger
+
+from memory_index import tokenize
+from memory_store import atomic_write_json
+
+
+class BloomFilter:
+    """Filtro de Bloom simples: 'talvez contém' / 'com certeza não contém'."""
+    def __init__(self, m_bits, k, bits=None):
+        self.m = m_bits
+        self.k = k
+        self.bits = bits if bits is not None else bytearray((m_bits + 7) // 8)
+
+    @classmethod
+    def for_capacity(cls, n_items, fp_rate=0.01):
+        n_items = max(n_items, 1)
+        m = max(64, int(-n_items * math.log(fp_rate) / (math.log(2) ** 2)))
+        k = max(1, round(m / n_items * math.log(2)))
+        return cls(m, k)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.m for i in range(self.k)]
+
+    def add(self, item):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+    def to_dict(self):
+        return {"m": self.m, "k": self.k, "bits": base64.b64encode(bytes(self.bits)).decode("ascii")}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d["m"], d["k"], bytearray(base64.b64decode(d["bits"])))
+
+
+class MemoryArchive:
+    """
+    Camada fria da memória episódica.
+    Blocos de memórias antigas viram segmentos imutáveis comprimidos (JSONL + gzip).
+    O manifest guarda, por segmento, o intervalo de ids/tempo e um Bloom filter dos termos,
+    então a busca só abre os segmentos que podem conter os termos da consulta.
+    Blocos novos ficam "em estágio" (buscáveis na RAM) até o próximo flush gravá-los.
+    """
+    def __init__(self, directory, cache_segments=4):
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, "manifest.json")
+        self.segments = []
+        self._blooms = []
+        self._cache = OrderedDict()   # Segmentos já descomprimidos (imutáveis)
+        self.cache_segments = cache_segments
+        self._staged = {}             # arquivo -> memórias ainda não gravadas
+        self._lock = threading.Lock()
+        self._load_manifest()
+
+    def _load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                self.segments = json.load(f).get("segments", [])
+            self._blooms = [BloomFilter.from_dict(seg["bloom"]) for seg in self.segments]
+        except Exception as e:
+            logger.error(f"Erro ao carregar manifest do arquivo de memórias: {e}")
+            self.segments, self._blooms = [], []
+
+    def __len__(self):
+        return sum(seg["count"] for seg in self.segments)
+
+    def has_segment(self, first_id):
+        return any(seg["first_id"] == first_id for seg in self.segments)
+
+    def append(self, first_id, entries, ids=None, last_id=None):
+        """
+        Coloca um bloco de memórias (ids first_id..) em estágio como um novo segmento.
+        Um bloco com lacunas (memórias que não foram arquivadas) passa os `ids` de cada
+        memória, que ficam gravados no campo "id".
+        """
+        if not entries or self.has_segment(first_id):
+            return  # Idempotente: o replay do diário pode re-arquivar o mesmo bloco
+        if ids is not None:
+            entries = [dict(mem, id=doc_id) for doc_id, mem in zip(ids, entries)]
+        last_id = last_id if last_id is not None else first_id + len(entries) - 1
+        name = f"seg-{first_id:010d}-{last_id:010d}.jsonl.gz"
+
+        terms = set()
+        for mem in entries:
+            terms.update(tokenize(mem["content"]))
+        bloom = BloomFilter.for_capacity(len(terms))
+        for term in terms:
+            bloom.add(term)
+
+        timestamps = [mem.get("timestamp", 0) for mem in entries]
+        self._staged[name] = list(entries)
+        self.segments.append({
+            "file": name,
+            "first_id": first_id,
+            "last_id": last_id,
+            "count": len(entries),
+            "t_min": min(timestamps),
+            "t_max": max(timestamps),
+            "bloom": bloom.to_dict(),
+        })
+        self._blooms.append(bloom)
+
+    def has_pending(self):
+        return bool(self._staged)
+
+    def flush(self):
+        """Grava os segmentos em estágio e o manifest (roda fora do event loop)."""
+        with self._lock:
+            staged = list(self._staged.items())
+            if not staged:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            for name, entries in staged:
+                path = os.path.join(self.directory, name)
+                tmp_path = f"{path}.tmp"
+                with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+                    for mem in entries:
+                        f.write(json.dumps(mem, ensure_ascii=False, separators=(",", ":")) + "\n")
+                os.replace(tmp_path, path)
+                del self._staged[name]
+                logger.info(f"🗃️ {len(entries)} memórias antigas arquivadas em {name}")
+            written = [seg for seg in list(self.segments) if seg["file"] not in self._staged]
+            atomic_write_json(self.manifest_path, {"segments": written})
+
+    def _read(self, seg):
+        staged = self._staged.get(seg["file"])
+        if staged is not None:
+            return staged
+        with self._lock:
+            cached = self._cache.get(seg["file"])
+            if cached is not None:
+                self._cache.move_to_end(seg["file"])
+                return cached
+            with gzip.open(os.path.join(self.directory, seg["file"]), 'rt', encoding='utf-8') as f:
+                entries = [json.loads(line) for line in f if line.strip()]
+            self._cache[seg["file"]] = entries
+            if len(self._cache) > self.cache_segments:
+                self._cache.popitem(last=False)
+            return entries
+
+    def iter_entries(self):
+        """Todas as memórias arquivadas como (id global, memória), em ordem de id."""
+        for seg in sorted(list(self.segments), key=lambda seg: seg["first_id"]):
+            for i, mem in enumerate(self._read(seg)):
+                yield mem.get("id", seg["first_id"] + i), mem
+
+    def search(self, terms, limit, below_id=None, max_segments=8):
+        """
+        Retorna [(mem, nº de termos encontrados)] dos segmentos mais novos para os mais antigos,
+        abrindo só os segmentos cujo Bloom filter pode conter algum termo.
+        `below_id` ignora segmentos cujas memórias ainda estão na camada quente.
+        """
+        query_terms = set(terms)
+        if not query_terms:
+            return []
+        hits = []
+        opened = 0
+        for seg, bloom in sorted(zip(list(self.segments), list(self._blooms)), key=lambda sb: sb[0]["t_max"], reverse=True):
+            if below_id is not None and seg["first_id"] >= below_id:
+                continue
+            if not any(term in bloom for term in query_terms):
+                continue
+            opened += 1
+            for mem in reversed(self._read(seg)):
+                matched = len(query_terms & set(tokenize(mem["content"])))
+                if matched:
+                    hits.append((mem, matched))
+            if len(hits) >= limit or opened >= max_segments:
+                break
+        return hits
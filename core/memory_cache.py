@@ -0,0 +1,75 @@
+from collections import OrderedDict
+
+
+class RecallCache:
+    """
+    Cache LRU dos resultados de recall().
+    A chave são os termos normalizados da consulta; cada termo aponta para as chaves
+    que o usam, então uma nova memória invalida só as consultas com termos em comum.
+    """
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self._entries = OrderedDict()   # chave -> resultados
+        self._by_term = {}              # termo -> {chaves}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.version = 0                # Muda a cada invalidação (protege buscas assíncronas)
+
+    @staticmethod
+    def make_key(terms, limit):
+        return (tuple(sorted(set(terms))), limit)
+
+    def get(self, key):
+        results = self._entries.get(key)
+        if results is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return [dict(r) for r in results]
+
+    def put(self, key, results, version=None):
+        if self.max_size <= 0:
+            return
+        if version is not None and version != self.version:
+            return  # Houve um store() durante a busca: o resultado pode estar velho
+        self._entries[key] = [dict(r) for r in results]
+        self._entries.move_to_end(key)
+        for term in key[0]:
+            self._by_term.setdefault(term, set()).add(key)
+        while len(self._entries) > self.max_size:
+            self._drop(next(iter(self._entries)))
+
+    def _drop(self, key):
+        self._entries.pop(key, None)
+        for term in key[0]:
+            keys = self._by_term.get(term)
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    del self._by_term[term]
+
+    def invalidate(self, terms):
+        """Remove as consultas que contêm algum dos termos (da memória nova ou arquivada)."""
+        self.version += 1
+        stale = set()
+        for term in set(terms):
+            stale.update(self._by_term.get(term, ()))
+        for key in stale:
+            self._drop(key)
+        self.invalidations += len(stale)
+
+    def clear(self):
+        self._entries.clear()
+        self._by_term.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            "size": len(self._entries),
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,218 @@
+import os
+import time
+import asyncio
+import importlib
+from collections import Counter
+from loguru import logger
+
+from memory_index import tokenize
+from memory_log import format_date
+from memory_store import atomic_write_json, read_json
+
+SEMANTIC_SOURCE = "semantic"
+MAX_GROUP = 40          # Memórias por resumo (limita o tamanho do prompt)
+TOPIC_OVERLAP = 0.4     # Fração dos termos em comum para entrar num tópico existente
+
+
+class ExtractiveSummarizer:
+    """
+    Resumo local (sem LLM): escolhe as memórias mais representativas do grupo,
+    pontuadas pela frequência dos seus termos no próprio grupo.
+    Serve de substituto offline e nos testes.
+    """
+    def __init__(self, max_sentences=3, max_chars=200):
+        self.max_sentences = max_sentences
+        self.max_chars = max_chars
+
+    async def summarize(self, day, texts):
+        df = Counter()
+        terms = [set(tokenize(t)) for t in texts]
+        for ts in terms:
+            df.update(ts)
+        scored = sorted(range(len(texts)), key=lambda i: -sum(df[t] for t in terms[i]) / (len(terms[i]) or 1))
+        chosen = sorted(scored[:self.max_sentences])
+        return f"[{day}] " + " | ".join(texts[i][:self.max_chars] for i in chosen)
+
+
+class LLMSummarizer:
+    """Resumo pelo LLM configurado (qualquer objeto com `ainvoke`); cai no extrativo se falhar."""
+    def __init__(self, llm, fallback=None):
+        self.llm = llm
+        self.fallback = fallback or ExtractiveSummarizer()
+
+    async def summarize(self, day, texts):
+        lines = "\n".join(f"- {t[:500]}" for t in texts)
+        prompt = f"""
+        Abaixo estão mensagens trocadas com o usuário em {day}.
+        Resuma em no máximo 3 frases os fatos duradouros (preferências, planos, decisões, dados pessoais).
+        Ignore saudações e conversa sem conteúdo. Responda só com o resumo, em português.
+
+        {lines}
+        """
+        try:
+            response = await self.llm.ainvoke(prompt)
+            summary = getattr(response, "content", response).strip()
+            if summary:
+                return f"[{day}] {summary}"
+        except Exception as e:
+            logger.warning(f"⚠️ Resumo via LLM falhou ({e}); usando resumo extrativo.")
+        return await self.fallback.summarize(day, texts)
+
+
+def load_summarizer(spec="llm", llm=None):
+    """'llm' (padrão, requer `llm`), 'extractive' ou 'modulo:Classe' com `async summarize(dia, textos)`."""
+    if spec == "extractive" or (spec in (None, "", "llm") and llm is None):
+        return ExtractiveSummarizer()
+    if spec in (None, "", "llm"):
+        return LLMSummarizer(llm)
+    module_name, _, attr = spec.partition(":")
+    return getattr(importlib.import_module(module_name), attr)()
+
+
+def group_entries(entries):
+    """
+    Agrupa [(id, mem)] por dia e, dentro do dia, por tópico (termos em comum).
+    Tópicos pequenos do mesmo dia viram um grupo "variado".
+    Retorna [(chave, dia, [(id, mem)])] em ordem cronológica.
+    """
+    by_day = {}
+    for doc_id, mem in entries:
+        by_day.setdefault(format_date(mem["timestamp"])[:10], []).append((doc_id, mem))
+
+    groups = []
+    for day, items in by_day.items():
+        topics = []     # [(termos do tópico, [(id, mem)])]
+        for doc_id, mem in items:
+            terms = set(tokenize(mem["content"]))
+            for topic_terms, members in topics:
+                if len(members) < MAX_GROUP and terms and len(terms & topic_terms) / len(terms) >= TOPIC_OVERLAP:
+                    topic_terms |= terms
+                    members.append((doc_id, mem))
+                    break
+            else:
+                topics.append((terms, [(doc_id, mem)]))
+        loose = []
+        for _, members in topics:
+            if len(members) >= 3:
+                groups.append(members)
+            else:
+                loose.extend(members)
+        for i in range(0, len(loose), MAX_GROUP):
+            groups.append(loose[i:i + MAX_GROUP])
+
+    result = []
+    for members in groups:
+        members.sort(key=lambda item: item[0])
+        day = format_date(members[0][1]["timestamp"])[:10]
+        result.append((f"{day}:{members[0][0]}-{members[-1][0]}:{len(members)}", day, members))
+    result.sort(key=lambda g: g[2][0][0])
+    return result
+
+
+class MemoryConsolidator:
+    """
+    Consolidação das memórias episódicas antigas.
+    As memórias da camada quente mais velhas que `min_age_days` são agrupadas por
+    dia/tópico, cada grupo vira uma memória "semantic" e as entradas originais vão
+    para o arquivo frio. O recall passa a varrer um conjunto menor e mais denso.
+    Entradas recentes no meio delas (ex.: reforçadas pela deduplicação) e resumos
+    anteriores são regravados no fim, sem ir para o arquivo.
+    Os resumos prontos ficam num checkpoint, então uma execução interrompida
+    continua de onde parou sem pagar o LLM de novo.
+    """
+    def __init__(self, summarizer=None, min_age_days=None, max_concurrency=None, min_entries=None):
+        self.summarizer = summarizer or ExtractiveSummarizer()
+        self.min_age_days = min_age_days if min_age_days is not None else float(os.getenv("MEMORY_CONSOLIDATE_AFTER_DAYS", "7"))
+        self.max_concurrency = max_concurrency or int(os.getenv("MEMORY_CONSOLIDATE_CONCURRENCY", "2"))
+        # Só vale consolidar quando há memórias antigas suficientes
+        self.min_entries = min_entries if min_entries is not None else int(os.getenv("MEMORY_CONSOLIDATE_MIN", "50"))
+        self._running = set()
+
+    @staticmethod
+    def _checkpoint_path(memory):
+        return os.path.splitext(memory.file_path)[0] + "_consolidation.json"
+
+    def _old_prefix(self, memory):
+        """
+        [(id global, mem)] do início da camada quente até a última memória antiga.
+        Não para na primeira recente: a deduplicação atualiza o timestamp de uma
+        memória antiga ("oi" de novo hoje) sem mudar a sua posição.
+        """
+        cutoff = time.time() - self.min_age_days * 86400
+        episodic = memory.data["episodic"]
+        last = max((i for i, ts in enumerate(episodic.timestamps) if ts < cutoff), default=-1)
+        return [(memory._base_id + i, episodic.get(i)) for i in range(last + 1)], cutoff
+
+    async def consolidate(self, memory):
+        """Consolida uma MemorySystem. Retorna quantas memórias saíram da camada quente."""
+        if memory.external:
+            logger.debug("Consolidação ignorada: memória episódica no SQLite")
+            return 0
+        if id(memory) in self._running:
+            return 0
+        self._running.add(id(memory))
+        try:
+            return await self._consolidate(memory)
+        finally:
+            self._running.discard(id(memory))
+
+    async def _consolidate(self, memory):
+        await memory.aensure_loaded()
+        prefix, cutoff = self._old_prefix(memory)
+        # Resumos anteriores e memórias recentes no meio do prefixo passam adiante como estão
+        carried = [(doc_id, mem) for doc_id, mem in prefix if mem["source"] == SEMANTIC_SOURCE or mem["timestamp"] >= cutoff]
+        carried_ids = {doc_id for doc_id, _ in carried}
+        old = [(doc_id, mem) for doc_id, mem in prefix if doc_id not in carried_ids]
+        if len(old) < self.min_entries:
+            return 0
+        upto = prefix[-1][0] + 1
+        path = self._checkpoint_path(memory)
+        # Checkpoint: resumos já prontos, pela chave do grupo (dia + faixa de ids)
+        checkpoint = await asyncio.to_thread(read_json, path) or {}
+        summaries = checkpoint.get("summaries", {})
+
+        groups = group_entries(old)
+        keys = {key for key, _, _ in groups}
+        summaries = {k: v for k, v in summaries.items() if k in keys}
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        save_lock = asyncio.Lock()
+        start = time.perf_counter()
+
+        async def summarize(key, day, members):
+            if key in summaries:
+                return
+            texts = [mem["content"] for _, mem in members]
+            if len(texts) == 1:
+                summaries[key] = texts[0]
+                return
+            async with semaphore:
+                summaries[key] = await self.summarizer.summarize(day, texts)
+            async with save_lock:
+                await asyncio.to_thread(atomic_write_json, path, {"summaries": dict(summaries)})
+
+        await asyncio.gather(*(summarize(*group) for group in groups))
+
+        # Primeiro o compact: assim a deduplicação não funde um resumo numa memória que vai sair
+        before = len(memory.data["episodic"])
+        # O que passa adiante não vai para o arquivo frio: é gravado outra vez logo abaixo
+        memory.compact(upto, skip_ids=carried_ids, flush=False)
+        for _, mem in carried:
+            memory.store(mem["content"], source=SEMANTIC_SOURCE, importance=mem["importance"],
+                         timestamp=mem["timestamp"], flush=False)
+        for key, day, members in groups:
+            memory.store(
+                summaries[key],
+                source=SEMANTIC_SOURCE,
+                importance=max(mem["importance"] for _, mem in members),
+                timestamp=max(mem["timestamp"] for _, mem in members),
+                flush=False
+            )
+        if memory.writer is None:
+            job = memory.prepare_flush()
+            if job:
+                await asyncio.to_thread(job)
+        if os.path.exists(path):
+            os.remove(path)
+        logger.success(f"🧩 Consolidação: {len(old)} memórias antigas viraram {len(groups)} resumos "
+                       f"({before} → {len(memory.data['episodic'])} na RAM, {time.perf_counter() - start:.1f}s)")
+        return len(old)
@@ -0,0 +1,80 @@
+import hashlib
+
+from memory_index import tokenize
+
+FINGERPRINT_BITS = 64
+BANDS = 4
+BAND_BITS = FINGERPRINT_BITS // BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+
+
+def _hash64(feature):
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def simhash(text):
+    """
+    Impressão digital SimHash de 64 bits (termos + pares de termos).
+    Textos quase iguais diferem em poucos bits. Retorna None se não há termos.
+    """
+    terms = tokenize(text)
+    if not terms:
+        return None
+    features = terms + [f"{a} {b}" for a, b in zip(terms, terms[1:])]
+    weights = [0] * FINGERPRINT_BITS
+    for feature in features:
+        h = _hash64(feature)
+        for bit in range(FINGERPRINT_BITS):
+            weights[bit] += 1 if (h >> bit) & 1 else -1
+    fp = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fp |= 1 << bit
+    return fp
+
+
+class NearDuplicateIndex:
+    """
+    LSH por bandas sobre SimHash: a impressão é cortada em 4 bandas de 16 bits.
+    Duas impressões com distância de Hamming <= 3 sempre compartilham ao menos
+    uma banda inteira, então basta olhar os buckets das 4 bandas (O(1) em média).
+    """
+    def __init__(self, max_distance=3):
+        self.max_distance = max_distance
+        self.buckets = {}        # (banda, valor) -> {doc_id}
+        self.fingerprints = {}   # doc_id -> impressão
+
+    @staticmethod
+    def _bands(fp):
+        return [(band, (fp >> (band * BAND_BITS)) & BAND_MASK) for band in range(BANDS)]
+
+    def add(self, doc_id, fp):
+        if fp is None:
+            return
+        self.fingerprints[doc_id] = fp
+        for key in self._bands(fp):
+            self.buckets.setdefault(key, set()).add(doc_id)
+
+    def remove(self, doc_id):
+        fp = self.fingerprints.pop(doc_id, None)
+        if fp is None:
+            return
+        for key in self._bands(fp):
+            bucket = self.buckets.get(key)
+            if bucket:
+                bucket.discard(doc_id)
+                if not bucket:
+                    del self.buckets[key]
+
+    def find(self, fp, accept=None):
+        """Retorna o doc_id mais recente quase idêntico a `fp` (ou None)."""
+        if fp is None:
+            return None
+        candidates = set()
+        for key in self._bands(fp):
+            candidates.update(self.buckets.get(key, ()))
+        for doc_id in sorted(candidates, reverse=True):
+            if bin(self.fingerprints[doc_id] ^ fp).count("1") <= self.max_distance:
+                if accept is None or accept(doc_id):
+                    return doc_id
+        return None
@@ -0,0 +1,120 @@
+import re
+import math
+import unicodedata
+from collections import Counter, deque
+from itertools import islice
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Palavras muito comuns (PT/EN) que casariam com quase toda memória
+STOPWORDS = {
+    "de", "da", "do", "das", "dos", "em", "no", "na", "nos", "nas", "um", "uma", "uns", "umas",
+    "os", "as", "ao", "aos", "que", "se", "por", "para", "pra", "com", "sem", "mas", "ou",
+    "eu", "me", "meu", "minha", "meus", "minhas", "voce", "seu", "sua", "ele", "ela", "isso",
+    "esse", "essa", "este", "esta", "qual", "quais", "como", "mais", "muito", "ja", "tem",
+    "the", "of", "and", "to", "in", "is", "it", "for", "on", "my", "an", "at", "be", "me",
+    "what", "with", "this", "that",
+}
+
+
+def _fold(text):
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+# Acentos do latim (é, ç, ã...) resolvidos por tabela: o NFKD caractere a caractere fica só para o resto
+_LATIN_FOLD = {c: _fold(chr(c)) for c in range(0x80, 0x250) if _fold(chr(c)) != chr(c)}
+
+
+def normalize(text):
+    """Minúsculas e sem acentos ("Reunião" -> "reuniao")."""
+    text = text.lower()
+    if text.isascii():
+        return text
+    text = text.translate(_LATIN_FOLD)
+    return text if text.isascii() else _fold(text)
+
+
+def tokenize(text):
+    """Quebra o texto em termos indexáveis (sem stopwords e sem termos de 1 letra)."""
+    return [t for t in TOKEN_RE.findall(normalize(text)) if len(t) > 1 and t not in STOPWORDS]
+
+
+class InvertedIndex:
+    """
+    Índice invertido termo -> lista de postings (doc_id, tf) com ids crescentes.
+    Os ids são sequenciais e as memórias saem pela ordem de chegada,
+    então remover a mais antiga é sempre um popleft nas listas dos seus termos.
+    Também mantém, de forma incremental, as estatísticas do BM25
+    (df = tamanho da lista, comprimento de cada documento e comprimento médio).
+    O custo do bm25() é proporcional aos postings percorridos: com 100k documentos,
+    dois termos comuns (~40k postings cada) levam ~24 ms em Python.
+    Limite `max_postings`: de um termo com mais postings que isso, só os mais recentes
+    entram no ranking; documentos mais antigos que só casam com esse termo ficam de
+    fora em silêncio (o df/idf continua sendo o da lista inteira).
+    """
+    def __init__(self, k1=1.5, b=0.75, max_postings=20000):
+        self.k1 = k1
+        self.b = b
+        # Termos muito frequentes: só os `max_postings` mais recentes entram no ranking
+        # (os mais antigos desse termo não são pontuados, sem aviso)
+        self.max_postings = max_postings
+        self.postings = {}
+        self.doc_len = {}
+        self.total_len = 0
+
+    def add(self, doc_id, text):
+        terms = Counter(tokenize(text))
+        for term, tf in terms.items():
+            plist = self.postings.get(term)
+            if plist is None:
+                plist = self.postings[term] = deque()
+            plist.append((doc_id, tf))
+        length = sum(terms.values())
+        self.doc_len[doc_id] = length
+        self.total_len += length
+
+    def remove_oldest(self, doc_id, text):
+        """Remove um documento que está saindo pela cauda (o mais antigo)."""
+        for term in set(tokenize(text)):
+            plist = self.postings.get(term)
+            if plist and plist[0][0] == doc_id:
+                plist.popleft()
+                if not plist:
+                    del self.postings[term]
+        self.total_len -= self.doc_len.pop(doc_id, 0)
+
+    def candidates(self, terms):
+        """Retorna {doc_id: nº de termos da busca presentes}, olhando só os postings."""
+        hits = {}
+        for term in set(terms):
+            for doc_id, _ in self.postings.get(term, ()):
+                hits[doc_id] = hits.get(doc_id, 0) + 1
+        return hits
+
+    def bm25(self, terms):
+        """Retorna {doc_id: score BM25} só para os documentos que contêm algum termo."""
+        n_docs = len(self.doc_len)
+        if not n_docs:
+            return {}
+        avgdl = self.total_len / n_docs or 1.0
+        k1, b = self.k1, self.b
+        norm = k1 * (1 - b)
+        slope = k1 * b / avgdl
+        doc_len = self.doc_len
+        scores = {}
+
+        for term in set(terms):
+            plist = self.postings.get(term)
+            if not plist:
+                continue
+            df = len(plist)
+            idf = math.log((n_docs - df + 0.5) / (df + 0.5) + 1)
+            if df > self.max_postings:
+                plist = islice(reversed(plist), self.max_postings)
+            for doc_id, tf in plist:
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (k1 + 1) / (tf + norm + slope * doc_len[doc_id])
+        return scores
+
+    def __len__(self):
+        return len(self.postings)
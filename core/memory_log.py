@@ -0,0 +1,82 @@
+import sys
+import time
+from array import array
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def format_date(timestamp):
+    return time.strftime(DATE_FORMAT, time.localtime(timestamp))
+
+
+class EpisodicLog:
+    """
+    Memórias episódicas em colunas paralelas (em vez de um dict por memória).
+    timestamps e importância ficam em array('d'), as origens são internadas
+    (uma única string por origem) e a data formatada só é gerada na saída.
+    Para quem lê, cada posição continua parecendo o dict de sempre (get/iter).
+    """
+    __slots__ = ("contents", "sources", "importance", "timestamps")
+
+    def __init__(self):
+        self.contents = []
+        self.sources = []
+        self.importance = array('d')
+        self.timestamps = array('d')
+
+    @classmethod
+    def from_dicts(cls, entries):
+        log = cls()
+        for entry in entries:
+            log.append(entry)
+        return log
+
+    def __len__(self):
+        return len(self.contents)
+
+    def append(self, entry):
+        self.contents.append(entry["content"])
+        self.sources.append(sys.intern(entry.get("source") or "chat"))
+        self.importance.append(entry.get("importance") or 1)
+        self.timestamps.append(entry.get("timestamp") or time.time())
+
+    def get(self, i):
+        """Materializa a posição `i` no formato dict clássico."""
+        importance = self.importance[i]
+        return {
+            "content": self.contents[i],
+            "source": self.sources[i],
+            "importance": int(importance) if importance.is_integer() else importance,
+            "timestamp": self.timestamps[i],
+            "date": format_date(self.timestamps[i]),
+        }
+
+    def __getitem__(self, i):
+        return self.get(i)
+
+    def __iter__(self):
+        for i in range(len(self.contents)):
+            yield self.get(i)
+
+    def touch(self, i, importance, timestamp):
+        """Reforça uma memória existente (usado no merge de quase-duplicatas)."""
+        self.importance[i] = importance
+        self.timestamps[i] = timestamp
+
+    def slice_dicts(self, start, stop):
+        return [self.get(i) for i in range(start, stop)]
+
+    def drop_oldest(self, count):
+        del self.contents[:count]
+        del self.sources[:count]
+        del self.importance[:count]
+        del self.timestamps[:count]
+
+    def frozen(self):
+        """Cópia barata das colunas (para serializar fora do event loop)."""
+        copy = EpisodicLog()
+        copy.contents = list(self.contents)
+        copy.sources = list(self.sources)
+        copy.importance = array('d', self.importance)
+        copy.timestamps = array('d', self.timestamps)
+        return copy
@@ -0,0 +1,624 @@
+import os
+import json
+import math
+import sqlite3
+import threading
+from collections import deque
+from loguru import logger
+
+from memory_log import format_date
+from memory_index import tokenize
+
+# Versão do layout do snapshot: a partir da 2, "episodic" é sempre a última chave
+# (perfil e metadados podem ser lidos sem passar pelas memórias)
+SNAPSHOT_FORMAT = 2
+
+
+def atomic_write_json(path, data, indent=None):
+    """Escreve JSON num arquivo temporário e troca atomicamente (nunca deixa o arquivo pela metade)."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=indent)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def atomic_write_snapshot(path, view):
+    """
+    Grava o estado da memória em streaming: perfil e metadados primeiro,
+    depois uma memória episódica por linha (sem montar a lista inteira na RAM).
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(f'{{"format": {SNAPSHOT_FORMAT},\n')
+        for key, value in view.items():
+            if key not in ("episodic", "format"):
+                f.write(f"{json.dumps(key)}: {json.dumps(value, ensure_ascii=False)},\n")
+        f.write('"episodic": [')
+        for i, mem in enumerate(view.get("episodic", ())):
+            f.write(",\n" if i else "\n")
+            f.write(json.dumps(mem, ensure_ascii=False, separators=(",", ":")))
+        f.write("\n]}\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_json(path):
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        data.pop("format", None)
+        return data
+    except Exception as e:
+        logger.error(f"Erro ao carregar memória: {e}")
+        return None
+
+
+class SnapshotReader:
+    """
+    Leitor incremental do snapshot (json.JSONDecoder.raw_decode sobre blocos do arquivo).
+    header() lê as chaves de topo até chegar em "episodic"; entries() entrega as
+    memórias uma a uma, sem montar a lista inteira (nem o texto inteiro) na RAM.
+    """
+    def __init__(self, path, chunk_size=1 << 16):
+        self._f = open(path, 'r', encoding='utf-8')
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+        self._decoder = json.JSONDecoder()
+        self.chunk_size = chunk_size
+        self.has_episodic = False
+        self.tail = {}          # Chaves depois de "episodic" (só em snapshots antigos)
+
+    def close(self):
+        self._f.close()
+
+    def _fill(self):
+        chunk = self._f.read(self.chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buf = self._buf[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def _peek(self):
+        """Próximo caractere não-branco (sem consumir)."""
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in " \t\r\n":
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                raise ValueError("snapshot terminou no meio")
+
+    def _expect(self, chars):
+        c = self._peek()
+        if c not in chars:
+            raise ValueError(f"esperado {chars!r} no snapshot, encontrado {c!r}")
+        self._pos += 1
+        return c
+
+    def _value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+                # Um número no fim do bloco pode continuar no próximo
+                if end < len(self._buf) or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            if not self._fill():
+                value, self._pos = self._decoder.raw_decode(self._buf, self._pos)
+                return value
+
+    def _members(self, target):
+        """Lê pares chave/valor até o fim do objeto ou até a chave "episodic"."""
+        while True:
+            if self._peek() == "}":
+                self._pos += 1
+                return
+            key = self._value()
+            self._expect(":")
+            if key == "episodic" and target is not self.tail:
+                self.has_episodic = True
+                self._expect("[")
+                return
+            target[key] = self._value()
+            if self._expect(",}") == "}":
+                return
+
+    def header(self):
+        header = {}
+        self._expect("{")
+        self._members(header)
+        return header
+
+    def entries(self):
+        try:
+            if self._peek() == "]":
+                self._pos += 1
+            else:
+                while True:
+                    yield self._value()
+                    if self._expect(",]") == "]":
+                        break
+            if self._expect(",}") == ",":
+                self._members(self.tail)
+        finally:
+            self.close()
+
+
+def open_snapshot(path):
+    """
+    Abre o snapshot para carga preguiçosa: devolve (cabeçalho, leitor), onde o leitor
+    entrega as memórias episódicas aos poucos (ou None se não há o que ler depois).
+    Snapshots antigos, com metadados depois de "episodic", são lidos inteiros.
+    """
+    if not os.path.exists(path):
+        return None, None
+    reader = None
+    try:
+        reader = SnapshotReader(path)
+        header = reader.header()
+        layout = header.pop("format", 1)
+        if not reader.has_episodic:
+            reader.close()
+            return header, None
+        if layout >= SNAPSHOT_FORMAT:
+            return header, reader
+        header["episodic"] = list(reader.entries())
+        header.update(reader.tail)
+        return header, None
+    except Exception as e:
+        if reader is not None:
+            reader.close()
+        logger.error(f"Erro ao carregar memória: {e}")
+        return None, None
+
+
+def snapshot_view(data):
+    """
+    Cópia rasa do estado para ser serializada fora do event loop.
+    As listas/dicts de topo são copiados; as entradas em si são compartilhadas.
+    """
+    view = {"profile": dict(data.get("profile", {}))}
+    for key, value in data.items():
+        if key not in ("profile", "episodic"):
+            view[key] = value
+    episodic = data.get("episodic", [])
+    view["episodic"] = episodic.frozen() if hasattr(episodic, "frozen") else list(episodic)
+    return view
+
+
+class JsonStore:
+    """
+    Persistência legada: reescreve o brain_data.json inteiro a cada flush.
+    Mantida para compatibilidade; a escrita agora é atômica.
+    """
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.dirty = False
+        self._version = 0           # Cada flush preparado ganha uma versão
+        self._written_version = 0   # Nunca sobrescreve um estado mais novo com um mais velho
+        self._io_lock = threading.Lock()
+
+    def load(self):
+        return read_json(self.file_path), []
+
+    def load_lazy(self):
+        header, reader = open_snapshot(self.file_path)
+        return header, reader, []
+
+    def record(self, op, data):
+        self.dirty = True
+
+    def prepare_flush(self, data, force_snapshot=False, snapshot_ok=True):
+        """
+        Captura o que precisa ir para o disco; o I/O fica no job retornado (ou None).
+        Com snapshot_ok=False (memórias ainda carregando) nada é gravado: o arquivo
+        inteiro é o snapshot.
+        """
+        if not snapshot_ok or not (self.dirty or force_snapshot):
+            return None
+        self.dirty = False
+        self._version += 1
+        view, version = snapshot_view(data), self._version
+        return lambda: self._write(view, version)
+
+    def _write(self, view, version):
+        with self._io_lock:
+            if version <= self._written_version:
+                return
+            self._written_version = version
+            try:
+                atomic_write_snapshot(self.file_path, view)
+            except Exception as e:
+                logger.error(f"Erro ao salvar memória: {e}")
+
+    def snapshot(self, data):
+        self.prepare_flush(data, force_snapshot=True)()
+
+    def close(self, data):
+        job = self.prepare_flush(data)
+        if job:
+            job()
+
+
+class JournalStore:
+    """
+    Persistência em diário (append-only).
+    Cada alteração vira uma linha JSON compacta no diário; de tempos em tempos
+    o estado completo é gravado como snapshot e o diário é zerado.
+    Na inicialização: carrega o snapshot e re-aplica o diário.
+    As linhas ficam num buffer até o próximo flush, então uma rajada de
+    alterações vira uma única escrita (e um único fsync).
+    """
+    def __init__(self, file_path, snapshot_every=500, fsync=False):
+        self.file_path = file_path
+        self.journal_path = os.path.splitext(file_path)[0] + ".journal"
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+        self.seq = 0              # Último número de sequência gravado
+        self.pending_ops = 0      # Operações no diário desde o último snapshot
+        self._buffer = deque()    # (seq, linha) ainda não escritas
+        self._snapshot_seq = 0    # seq do último snapshot gravado
+        self._fh = None
+        self._io_lock = threading.Lock()
+
+    def load(self):
+        data = read_json(self.file_path)
+        return data, self._load_journal(data)
+
+    def load_lazy(self):
+        """Como load(), mas as memórias do snapshot vêm de um leitor incremental."""
+        header, reader = open_snapshot(self.file_path)
+        return header, reader, self._load_journal(header)
+
+    def _load_journal(self, data):
+        snapshot_seq = (data or {}).get("journal_seq", 0)
+        self.seq = snapshot_seq
+        ops = []
+
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, 'rb') as f:
+                raw = f.read()
+            # Cauda sem "\n" = escrita interrompida por um crash: descartamos do disco
+            # para que a próxima linha anexada não fique colada no fragmento.
+            good_end = raw.rfind(b"\n") + 1
+            if good_end < len(raw):
+                logger.warning("⚠️ Diário: última linha incompleta descartada.")
+                with open(self.journal_path, 'r+b') as f:
+                    f.truncate(good_end)
+
+            for line_no, line in enumerate(raw[:good_end].decode('utf-8', errors='replace').splitlines(), 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    op = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"⚠️ Diário: linha {line_no} corrompida ignorada.")
+                    continue
+                # Operações já incorporadas ao snapshot (crash entre snapshot e truncate)
+                if op.get("seq", 0) <= snapshot_seq:
+                    continue
+                ops.append(op)
+                self.seq = max(self.seq, op["seq"])
+
+        self.pending_ops = len(ops)
+        self._snapshot_seq = snapshot_seq
+        return ops
+
+    def record(self, op, data):
+        self.seq += 1
+        op["seq"] = self.seq
+        self._buffer.append((self.seq, json.dumps(op, ensure_ascii=False, separators=(",", ":")) + "\n"))
+        self.pending_ops += 1
+
+    def prepare_flush(self, data, force_snapshot=False, snapshot_ok=True):
+        """
+        Chamado no event loop: captura o snapshot (se devido) e devolve o job de I/O (ou None).
+        O job esvazia o buffer sob lock, então jobs concorrentes nunca gravam fora de ordem.
+        Com snapshot_ok=False (memórias ainda carregando) só o diário é gravado.
+        """
+        snap = None
+        if snapshot_ok and (force_snapshot or self.pending_ops >= self.snapshot_every):
+            snap = snapshot_view(data)
+            snap["journal_seq"] = self.seq
+            self.pending_ops = 0
+        if not self._buffer and snap is None:
+            return None
+        return lambda: self._write(snap)
+
+    def _append_lines(self, lines):
+        if not lines:
+            return
+        if self._fh is None:
+            self._fh = open(self.journal_path, 'a', encoding='utf-8')
+        self._fh.write("".join(lines))
+        self._fh.flush()
+        if self.fsync:
+            os.fsync(self._fh.fileno())
+
+    def _write(self, snap):
+        with self._io_lock:
+            pending = []
+            while self._buffer:
+                pending.append(self._buffer.popleft())
+            try:
+                if snap is None or snap["journal_seq"] <= self._snapshot_seq:
+                    self._append_lines([line for _, line in pending])
+                    return
+                # Linhas já cobertas pelo snapshot vão antes; as mais novas, depois do truncate
+                cut = snap["journal_seq"]
+                self._append_lines([line for seq, line in pending if seq <= cut])
+                self._write_snapshot(snap)
+                self._append_lines([line for seq, line in pending if seq > cut])
+            except Exception as e:
+                logger.error(f"Erro ao gravar diário da memória: {e}")
+
+    def _write_snapshot(self, view):
+        """Grava o estado completo e zera o diário."""
+        try:
+            atomic_write_snapshot(self.file_path, view)
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+            # Só trunca depois que o snapshot está no disco
+            open(self.journal_path, 'w', encoding='utf-8').close()
+            self._snapshot_seq = view["journal_seq"]
+            logger.debug(f"📸 Snapshot da memória gravado (seq {view['journal_seq']})")
+        except Exception as e:
+            logger.error(f"Erro ao salvar snapshot da memória: {e}")
+
+    def snapshot(self, data):
+        self.prepare_flush(data, force_snapshot=True)()
+
+    def close(self, data):
+        job = self.prepare_flush(data, force_snapshot=self.pending_ops > 0)
+        if job:
+            job()
+        with self._io_lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS profile (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS episodic (
+    id INTEGER PRIMARY KEY,
+    content TEXT NOT NULL,
+    source TEXT,
+    importance REAL,
+    timestamp REAL,
+    date TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_episodic_source ON episodic(source);
+CREATE INDEX IF NOT EXISTS idx_episodic_importance ON episodic(importance);
+CREATE INDEX IF NOT EXISTS idx_episodic_timestamp ON episodic(timestamp);
+CREATE VIRTUAL TABLE IF NOT EXISTS episodic_fts USING fts5(
+    content, content='episodic', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS episodic_ai AFTER INSERT ON episodic BEGIN
+    INSERT INTO episodic_fts(rowid, content) VALUES (new.id, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS episodic_ad AFTER DELETE ON episodic BEGIN
+    INSERT INTO episodic_fts(episodic_fts, rowid, content) VALUES ('delete', old.id, old.content);
+END;
+"""
+
+EPISODIC_COLUMNS = ("content", "source", "importance", "timestamp", "date")
+
+
+def _episodic_row(entry):
+    # Entradas novas não carregam mais "date": a coluna é preenchida a partir do timestamp
+    row = [entry.get(c) for c in EPISODIC_COLUMNS]
+    if row[4] is None and row[3] is not None:
+        row[4] = format_date(row[3])
+    return tuple(row)
+
+
+class SQLiteStore:
+    """
+    Banco SQLite em modo WAL: perfil e memórias episódicas ficam no disco,
+    com busca full-text (FTS5) sobre `content` e índices em source/importance/timestamp.
+    As memórias não são carregadas na RAM e não há limite de 1000 entradas.
+    Leitores concorrentes (CLI, diagnósticos) veem um snapshot consistente enquanto o bot grava.
+    As operações ficam num buffer e cada flush grava todas numa única transação.
+    """
+    owns_episodic = True
+
+    def __init__(self, file_path, fsync=False):
+        self.file_path = file_path
+        self.db_path = os.path.splitext(file_path)[0] + ".db"
+        self._buffer = deque()
+        self._lock = threading.Lock()   # A conexão é usada pelo loop e pela thread de escrita
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(f"PRAGMA synchronous={'FULL' if fsync else 'NORMAL'}")
+        self.conn.executescript(SQLITE_SCHEMA)
+        self.conn.commit()
+
+    def load(self):
+        self._migrate_json()
+        profile = {k: json.loads(v) for k, v in self.conn.execute("SELECT key, value FROM profile")}
+        return {"profile": profile, "episodic": []}, []
+
+    def _migrate_json(self):
+        """
+        Na primeira execução, importa a memória do modo diário: arquivo frio (segmentos
+        <base>_archive), snapshot e diário (store/merge/pref), na ordem dos ids globais.
+        """
+        if self.conn.execute("SELECT 1 FROM meta WHERE key = 'migrated'").fetchone():
+            return
+        from memory_archive import MemoryArchive  # memory_archive importa este módulo
+
+        data, ops = JournalStore(self.file_path).load()
+        data = data or {}
+        profile = dict(data.get("profile", {}))
+        by_id = {}      # id global -> memória
+        archive = MemoryArchive(os.path.splitext(self.file_path)[0] + "_archive")
+        for doc_id, mem in archive.iter_entries():
+            by_id[doc_id] = dict(mem)
+        next_id = data.get("archived", 0)
+        for mem in data.get("episodic", []):
+            by_id[next_id] = dict(mem)
+            next_id += 1
+        for op in ops:
+            kind = op.get("op")
+            if kind == "pref":
+                profile[op["key"]] = op["value"]
+            elif kind == "store":
+                by_id[next_id] = dict(op["entry"])
+                next_id += 1
+            elif kind == "merge" and op["id"] in by_id:
+                by_id[op["id"]].update(importance=op["importance"], timestamp=op["timestamp"])
+            # "compact" só tira da camada quente: no SQLite tudo fica no mesmo banco
+        episodic = [by_id[doc_id] for doc_id in sorted(by_id)]
+
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO profile (key, value) VALUES (?, ?)",
+                [(k, json.dumps(v, ensure_ascii=False)) for k, v in profile.items()]
+            )
+            self.conn.executemany(
+                "INSERT INTO episodic (content, source, importance, timestamp, date) VALUES (?, ?, ?, ?, ?)",
+                [_episodic_row(m) for m in episodic]
+            )
+            self.conn.execute("INSERT INTO meta (key, value) VALUES ('migrated', '1')")
+        if profile or episodic:
+            logger.success(f"🗄️ Memória migrada para SQLite: {len(episodic)} memórias "
+                           f"({len(archive)} do arquivo frio), {len(profile)} preferências")
+
+    def record(self, op, data):
+        self._buffer.append(op)
+
+    def prepare_flush(self, data, force_snapshot=False, snapshot_ok=True):
+        return self._write if self._buffer else None
+
+    def has_pending(self):
+        return bool(self._buffer)
+
+    def _write(self):
+        with self._lock:
+            ops = []
+            while self._buffer:
+                ops.append(self._buffer.popleft())
+            prefs = [(op["key"], json.dumps(op["value"], ensure_ascii=False)) for op in ops if op["op"] == "pref"]
+            entries = [_episodic_row(op["entry"]) for op in ops if op["op"] == "store"]
+            if not ops:
+                return
+            try:
+                with self.conn:
+                    if prefs:
+                        self.conn.executemany("INSERT OR REPLACE INTO profile (key, value) VALUES (?, ?)", prefs)
+                    if entries:
+                        self.conn.executemany(
+                            "INSERT INTO episodic (content, source, importance, timestamp, date) VALUES (?, ?, ?, ?, ?)",
+                            entries
+                        )
+            except Exception as e:
+                logger.error(f"Erro ao gravar memória no SQLite: {e}")
+
+    def search(self, terms, limit, mode="bm25"):
+        """
+        Busca FTS5. Retorna [(mem, score)]: no modo "bm25" o score é BM25 (maior = melhor);
+        no modo "recent" vem em ordem cronológica reversa.
+        """
+        if not terms:
+            return []
+        quoted = ['"' + t.replace('"', '""') + '"' for t in sorted(set(terms))]
+        if mode != "bm25":
+            with self._lock:
+                rows = self.conn.execute(
+                    """SELECT e.content, e.source, e.importance, e.timestamp, e.date, 0
+                       FROM episodic_fts f JOIN episodic e ON e.id = f.rowid
+                       WHERE episodic_fts MATCH ? ORDER BY f.rowid DESC LIMIT ?""",
+                    (" OR ".join(quoted), limit)
+                ).fetchall()
+            return [(dict(zip(EPISODIC_COLUMNS, row[:5])), row[5]) for row in rows]
+        return self._search_bm25(quoted, limit)
+
+    def _search_bm25(self, quoted, limit, k1=1.5, b=0.75):
+        """
+        BM25 sobre um conjunto limitado de candidatos, para o custo não crescer com o banco
+        (ORDER BY rank num OR de termos comuns pontua todas as linhas que casam).
+        Candidatos: as `limit` linhas mais novas com todos os termos e as `limit` mais novas
+        de cada termo (ORDER BY rowid DESC é um percurso curto no FTS5). O df de um termo
+        que enche a janela é estimado pela densidade dele entre as linhas mais novas.
+        """
+        with self._lock:
+            n_docs = self.conn.execute("SELECT MAX(id) FROM episodic").fetchone()[0] or 0
+            window = "SELECT rowid FROM episodic_fts WHERE episodic_fts MATCH ? ORDER BY rowid DESC LIMIT ?"
+            ids = set()
+            df = {}
+            for term in quoted:
+                rowids = [r[0] for r in self.conn.execute(window, (term, limit))]
+                ids.update(rowids)
+                if len(rowids) < limit:
+                    df[term] = len(rowids)
+                else:
+                    df[term] = min(n_docs, round(limit * n_docs / (rowids[0] - rowids[-1] + 1)))
+            if len(quoted) > 1:
+                ids.update(r[0] for r in self.conn.execute(window, (" AND ".join(quoted), limit)))
+            rows = []
+            ids = sorted(ids)
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                rows += self.conn.execute(
+                    f"SELECT content, source, importance, timestamp, date FROM episodic WHERE id IN ({','.join('?' * len(chunk))})",
+                    chunk
+                ).fetchall()
+        if not rows:
+            return []
+
+        idf = {term.strip('"').replace('""', '"'): math.log((n_docs - d + 0.5) / (d + 0.5) + 1) for term, d in df.items()}
+        docs = [(row, tokenize(row[0])) for row in rows]
+        avgdl = sum(len(tokens) for _, tokens in docs) / len(docs) or 1.0
+        scored = []
+        for row, tokens in docs:
+            norm = k1 * (1 - b + b * len(tokens) / avgdl)
+            score = 0.0
+            for term, weight in idf.items():
+                tf = tokens.count(term)
+                if tf:
+                    score += weight * tf * (k1 + 1) / (tf + norm)
+            scored.append((dict(zip(EPISODIC_COLUMNS, row)), score))
+        scored.sort(key=lambda kv: kv[1], reverse=True)
+        return scored[:limit]
+
+    def count(self):
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM episodic").fetchone()[0]
+
+    def snapshot(self, data):
+        job = self.prepare_flush(data)
+        if job:
+            job()
+        with self._lock:
+            self.conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def close(self, data):
+        self.snapshot(data)
+        with self._lock:
+            self.conn.close()
+
+
+def make_store(mode, file_path, snapshot_every=500, fsync=False):
+    if mode == "sqlite":
+        return SQLiteStore(file_path, fsync=fsync)
+    if mode == "json":
+        return JsonStore(file_path)
+    if mode == "journal":
+        return JournalStore(file_path, snapshot_every=snapshot_every, fsync=fsync)
+    raise ValueError(f"Modo de armazenamento desconhecido: {mode}")
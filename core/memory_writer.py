@@ -0,0 +1,91 @@
+import os
+import asyncio
+from loguru import logger
+
+
+class MemoryWriter:
+    """
+    Escritor de fundo único para todas as memórias.
+    Cada alteração só marca a MemorySystem como "suja"; depois de `flush_interval`
+    segundos (janela de coalescência) o writer grava tudo numa thread, então uma
+    rajada de store() vira um único flush e o event loop nunca espera o disco.
+    A durabilidade é configurável: intervalo de flush (MEMORY_FLUSH_INTERVAL) e
+    fsync a cada flush (MEMORY_FSYNC, aplicado pelos backends).
+    """
+    def __init__(self, flush_interval=None):
+        self.flush_interval = flush_interval if flush_interval is not None else float(os.getenv("MEMORY_FLUSH_INTERVAL", "1.0"))
+        self._dirty = {}            # id(memória) -> memória, na ordem em que sujaram
+        self._wakeup = None
+        self._stop_event = None
+        self._task = None
+        self._stopping = False
+        self._io_lock = asyncio.Lock()     # Um job de I/O por vez (detach() espera o que estiver rodando)
+        self.flushes = 0            # Quantos jobs de I/O rodaram
+        self.marks = 0              # Quantas alterações foram coalescidas neles
+
+    def start(self):
+        """Inicia a task de escrita no event loop atual."""
+        self._wakeup = asyncio.Event()
+        self._stop_event = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        if self._dirty:
+            self._wakeup.set()
+        logger.info(f"💾 Escritor de memória iniciado (flush a cada {self.flush_interval}s)")
+
+    def mark_dirty(self, memory):
+        self._dirty[id(memory)] = memory
+        self.marks += 1
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self):
+        while not self._stopping:
+            await self._wakeup.wait()
+            if not self._stopping:
+                try:
+                    # Janela de coalescência (interrompida no shutdown)
+                    await asyncio.wait_for(self._stop_event.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Grava agora tudo que estiver pendente."""
+        dirty, self._dirty = self._dirty, {}
+        for memory in dirty.values():
+            try:
+                async with self._io_lock:
+                    if memory.writer is not self:
+                        continue    # Saiu do escritor (detach) e vai ser fechada
+                    job = memory.prepare_flush()
+                    if job is None:
+                        continue
+                    await asyncio.to_thread(job)
+                self.flushes += 1
+            except Exception as e:
+                logger.error(f"Erro no flush da memória: {e}")
+
+    async def detach(self, memory):
+        """
+        Tira a memória do escritor antes de ela ser fechada: descarta a marca de suja
+        (o close() grava tudo) e espera um flush dela que já esteja em andamento.
+        """
+        async with self._io_lock:
+            self._dirty.pop(id(memory), None)
+            if memory.writer is self:
+                memory.writer = None
+
+    async def stop(self):
+        """Flush final e encerramento limpo (chamar no shutdown do bot)."""
+        self._stopping = True
+        if self._task is not None:
+            self._stop_event.set()
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+        logger.info(f"💾 Escritor de memória parado ({self.marks} alterações em {self.flushes} flushes)")
+
+    def stats(self):
+        return {"flushes": self.flushes, "marks": self.marks, "pending": len(self._dirty)}
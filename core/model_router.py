@@ -0,0 +1,109 @@
+import os
+import time
+from collections import deque
+from loguru import logger
+
+# Tipos de tarefa e a ordem de preferência padrão dos modelos (o primeiro saudável ganha)
+DEFAULT_ROUTES = {
+    "intent": "llama-3.1-8b-instant,llama-3.3-70b-versatile",       # JSON pequeno e estruturado
+    "chat": "llama-3.3-70b-versatile,llama-3.1-8b-instant",         # Resposta ao usuário
+    "summary": "llama-3.1-8b-instant,llama-3.3-70b-versatile",      # Consolidação da memória (fundo)
+}
+
+
+class ModelStats:
+    """Janela deslizante das últimas `window` chamadas de um modelo: latência e sucesso."""
+    def __init__(self, window=50):
+        self.samples = deque(maxlen=window)     # (latência em s, ok)
+        self.degraded_until = 0.0
+
+    def record(self, latency, ok):
+        self.samples.append((latency, ok))
+
+    def p95(self):
+        latencies = sorted(lat for lat, ok in self.samples if ok)
+        if not latencies:
+            return 0.0
+        return latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+
+    def error_rate(self):
+        if not self.samples:
+            return 0.0
+        return sum(1 for _, ok in self.samples if not ok) / len(self.samples)
+
+
+class ModelRouter:
+    """
+    Escolhe o modelo de cada tarefa (intent, chat, summary) pela ordem configurada,
+    pulando os degradados: p95 de latência acima de `max_p95` ou taxa de erro acima
+    de `max_error_rate` na janela recente. Um modelo degradado fica fora por `cooldown`
+    segundos e volta com a janela zerada. Se todos estiverem degradados, usa o de
+    menor taxa de erro.
+    """
+    def __init__(self, routes=None, window=None, max_p95=None, max_error_rate=None, cooldown=None, min_samples=None):
+        routes = routes or {task: os.getenv(f"LLM_MODEL_{task.upper()}", models) for task, models in DEFAULT_ROUTES.items()}
+        self.routes = {task: [m.strip() for m in models.split(",") if m.strip()] if isinstance(models, str) else list(models)
+                       for task, models in routes.items()}
+        self.window = window or int(os.getenv("ROUTER_WINDOW", "50"))
+        self.max_p95 = max_p95 if max_p95 is not None else float(os.getenv("ROUTER_MAX_P95", "8"))
+        self.max_error_rate = max_error_rate if max_error_rate is not None else float(os.getenv("ROUTER_MAX_ERROR_RATE", "0.3"))
+        self.cooldown = cooldown if cooldown is not None else float(os.getenv("ROUTER_COOLDOWN", "60"))
+        self.min_samples = min_samples if min_samples is not None else int(os.getenv("ROUTER_MIN_SAMPLES", "5"))
+        self.stats_by_model = {}
+        self.decisions = 0
+
+    @property
+    def models(self):
+        """Todos os modelos usados em alguma rota (sem repetir, na ordem em que aparecem)."""
+        return list(dict.fromkeys(m for models in self.routes.values() for m in models))
+
+    def _stats(self, model):
+        if model not in self.stats_by_model:
+            self.stats_by_model[model] = ModelStats(self.window)
+        return self.stats_by_model[model]
+
+    def healthy(self, model, now=None):
+        stats = self._stats(model)
+        now = now if now is not None else time.monotonic()
+        if stats.degraded_until:
+            if now < stats.degraded_until:
+                return False
+            # Fim da quarentena: recomeça com a janela limpa
+            stats.degraded_until = 0.0
+            stats.samples.clear()
+        return True
+
+    def candidates(self, task):
+        """Modelos da tarefa em ordem de tentativa: saudáveis primeiro, depois os degradados (menos erros antes)."""
+        models = self.routes.get(task) or self.routes["chat"]
+        now = time.monotonic()
+        healthy = [m for m in models if self.healthy(m, now)]
+        degraded = sorted((m for m in models if m not in healthy), key=lambda m: self._stats(m).error_rate())
+        return healthy + degraded
+
+    def record(self, task, model, latency, ok):
+        self.decisions += 1
+        stats = self._stats(model)
+        stats.record(latency, ok)
+        status = "ok" if ok else "erro"
+        logger.info(f"🧭 {task} → {model} ({latency:.2f}s, {status})")
+        if len(stats.samples) >= self.min_samples and not stats.degraded_until:
+            p95, errors = stats.p95(), stats.error_rate()
+            if p95 > self.max_p95 or errors > self.max_error_rate:
+                stats.degraded_until = time.monotonic() + self.cooldown
+                logger.warning(f"🧭 Modelo {model} degradado (p95 {p95:.2f}s, erros {errors:.0%}): "
+                               f"fora das rotas por {self.cooldown:.0f}s")
+        if self.decisions % 50 == 0:
+            logger.info(f"🧭 Roteador de modelos: {self.stats()}")
+
+    def stats(self):
+        now = time.monotonic()
+        return {
+            model: {
+                "calls": len(stats.samples),
+                "p95_s": round(stats.p95(), 3),
+                "error_rate": round(stats.error_rate(), 3),
+                "degraded": stats.degraded_until > now,
+            }
+            for model, stats in self.stats_by_model.items()
+        }
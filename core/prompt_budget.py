@@ -0,0 +1,157 @@
+import os
+import re
+import math
+from loguru import logger
+
+from memory_index import tokenize
+
+try:
+    import tiktoken
+except ImportError:  # Contagem exata é opcional: sem tiktoken usamos uma estimativa
+    tiktoken = None
+
+# Pedaços de texto para a estimativa sem tiktoken (palavras e pontuação)
+PIECE_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+ELLIPSIS = "…"
+
+
+class Tokenizer:
+    """
+    Contagem de tokens local. Com tiktoken usa o BPE `encoding` (não é o tokenizer
+    exato do Llama, mas erra por pouco); sem ele, estima ~4 caracteres por token.
+    """
+    def __init__(self, encoding=None):
+        self.encoding = None
+        if tiktoken is not None:
+            try:
+                self.encoding = tiktoken.get_encoding(encoding or os.getenv("PROMPT_TOKENIZER", "cl100k_base"))
+            except Exception as e:
+                logger.warning(f"⚠️ tiktoken indisponível ({e}); usando estimativa de tokens.")
+
+    @staticmethod
+    def _piece_tokens(piece):
+        return max(1, math.ceil(len(piece) / 4))
+
+    def count(self, text):
+        if not text:
+            return 0
+        if self.encoding is not None:
+            return len(self.encoding.encode(text))
+        return sum(self._piece_tokens(p) for p in PIECE_RE.findall(text))
+
+    def truncate(self, text, max_tokens):
+        """Corta `text` em até `max_tokens` tokens, numa fronteira de palavra e com reticências."""
+        if self.count(text) <= max_tokens:
+            return text
+        if max_tokens <= 1:
+            return ""
+        budget = max_tokens - 1     # Espaço para as reticências
+        if self.encoding is not None:
+            cut = self.encoding.decode(self.encoding.encode(text)[:budget])
+        else:
+            end = 0
+            for match in PIECE_RE.finditer(text):
+                budget -= self._piece_tokens(match.group())
+                if budget < 0:
+                    break
+                end = match.end()
+            cut = text[:end]
+        # Não deixa meia palavra no fim
+        if " " in cut and not text[len(cut):len(cut) + 1].isspace():
+            cut = cut.rsplit(" ", 1)[0]
+        return cut.rstrip(" ,;:-") + ELLIPSIS
+
+
+def parse_result(result):
+    """Resultado da Brave ("Título: url\\ndescrição" ou dict) em (título, url, descrição)."""
+    if isinstance(result, dict):
+        return result.get("title", ""), result.get("url", ""), result.get("description", "")
+    head, _, description = str(result).partition("\n")
+    title, _, url = head.rpartition(": ")
+    if not title:
+        title, url = head, ""
+    return title.strip(), url.strip(), description.strip()
+
+
+class PromptBudget:
+    """
+    Orçamento de tokens dos trechos variáveis do prompt (memórias e resultados de busca).
+    Os itens entram em ordem de relevância até o orçamento acabar; o último que não
+    cabe inteiro é truncado (mantendo o formato de lista) e o resto fica de fora.
+    """
+    def __init__(self, memory_tokens=None, search_tokens=None, tokenizer=None):
+        self.memory_tokens = memory_tokens if memory_tokens is not None else int(os.getenv("PROMPT_MEMORY_TOKENS", "600"))
+        self.search_tokens = search_tokens if search_tokens is not None else int(os.getenv("PROMPT_SEARCH_TOKENS", "900"))
+        self.tokenizer = tokenizer or Tokenizer()
+        self.min_piece = 16         # Abaixo disso, truncar não vale a pena: o item fica de fora
+        self.tokens_in = 0
+        self.tokens_out = 0
+
+    def _pack(self, lines, budget):
+        """Junta as linhas (já ordenadas) até `budget` tokens. Retorna (texto, incluídas)."""
+        packed = []
+        left = budget
+        for line in lines:
+            cost = self.tokenizer.count(line) + 1   # +1 da quebra de linha
+            if cost <= left:
+                packed.append(line)
+                left -= cost
+                continue
+            if left >= self.min_piece:
+                packed.append(self.tokenizer.truncate(line, left - 1))
+            break
+        return "\n".join(packed), len(packed)
+
+    def _account(self, kind, raw, text, kept, total):
+        before, after = self.tokenizer.count(raw), self.tokenizer.count(text)
+        self.tokens_in += before
+        self.tokens_out += after
+        if after < before:
+            logger.info(f"✂️ Prompt ({kind}): {before} → {after} tokens ({kept}/{total} itens)")
+
+    def pack_memories(self, memories):
+        """Memórias do recall (já em ordem de relevância) como lista "- conteúdo" dentro do orçamento."""
+        if not memories:
+            return "Nenhuma."
+        lines = []
+        seen = set()
+        for mem in memories:
+            content = " ".join(mem["content"].split())
+            if content and content not in seen:
+                seen.add(content)
+                lines.append(f"- {content}")
+        text, kept = self._pack(lines, self.memory_tokens)
+        self._account("memórias", "\n".join(f"- {m['content']}" for m in memories), text, kept, len(memories))
+        return text or "Nenhuma."
+
+    def pack_results(self, results, query=""):
+        """
+        Resultados de busca numerados ("1. Título — descrição (url)"), os que mais
+        cobrem os termos da consulta primeiro (empate: ordem original da busca).
+        """
+        if not results:
+            return "Nenhum resultado."
+        terms = set(tokenize(query or ""))
+        parsed = [parse_result(r) for r in results]
+
+        def score(item):
+            i, (title, _, description) = item
+            overlap = len(terms & set(tokenize(f"{title} {description}"))) if terms else 0
+            return (-overlap, i)
+
+        lines = []
+        for n, (_, (title, url, description)) in enumerate(sorted(enumerate(parsed), key=score), 1):
+            # A url vem antes da descrição: se a linha for truncada, só a descrição perde o fim
+            line = f"{n}. {title}" + (f" ({url})" if url else "") + (f" — {description}" if description else "")
+            lines.append(line)
+        text, kept = self._pack(lines, self.search_tokens)
+        self._account("busca", str(results), text, kept, len(results))
+        return text or "Nenhum resultado."
+
+    def stats(self):
+        return {
+            "tokens_in": self.tokens_in,
+            "tokens_out": self.tokens_out,
+            "saved": self.tokens_in - self.tokens_out,
+            "tokenizer": "tiktoken" if self.tokenizer.encoding is not None else "estimate",
+        }
@@ -0,0 +1,190 @@
+import os
+import re
+import time
+import heapq
+import random
+import asyncio
+import itertools
+from loguru import logger
+
+# Prioridades da fila (menor sai primeiro)
+INTERACTIVE = 0     # Resposta a uma mensagem do usuário
+BACKGROUND = 1      # Jobs de fundo (consolidação da memória etc.)
+
+DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+RETRYABLE_STATUS = (408, 429, 500, 502, 503, 504)
+
+
+def parse_duration(value):
+    """Durações dos headers da Groq ("7.66s", "2m59.56s", "120ms") ou segundos puros ("3") em segundos."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = DURATION_RE.findall(value)
+    if not parts:
+        return None
+    scale = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    return sum(float(n) * scale[unit] for n, unit in parts)
+
+
+def is_retryable(error):
+    """429, timeouts, 5xx e falhas de conexão valem nova tentativa; erro de prompt/chave não."""
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    name = type(error).__name__
+    return any(kind in name for kind in ("RateLimit", "Timeout", "Connection"))
+
+
+class TokenBucket:
+    """Balde de fichas: `capacity` por minuto, reabastecido continuamente."""
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.capacity / 60.0)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Segundos até caberem `amount` fichas (0 = já cabem)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)     # Pedido maior que o balde: espera o balde cheio
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) * 60.0 / self.capacity
+
+    def take(self, amount, now):
+        self._refill(now)
+        self.tokens -= amount
+
+    def limit(self, remaining, capacity=None):
+        """Ajusta pelo que o provedor informou (nunca acima do que ele diz que resta)."""
+        if capacity:
+            self.capacity = float(capacity)
+        if remaining is not None:
+            self.tokens = min(self.tokens, float(remaining))
+
+
+class RateLimiter:
+    """
+    Limitador do lado do cliente para a API da Groq.
+    Dois baldes (requisições e tokens por minuto) dimensionados pelos limites da conta,
+    corrigidos pelos headers x-ratelimit-* de cada resposta e pausados pelo retry-after
+    de um 429. Os pedidos esperam numa fila por prioridade: respostas ao usuário passam
+    na frente dos jobs de fundo. Falhas transitórias voltam com backoff exponencial com jitter.
+    """
+    def __init__(self, rpm=None, tpm=None, max_retries=None, base_delay=None, max_delay=None):
+        self.requests = TokenBucket(rpm if rpm is not None else int(os.getenv("GROQ_RPM", "30")))
+        self.tokens = TokenBucket(tpm if tpm is not None else int(os.getenv("GROQ_TPM", "6000")))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("GROQ_MAX_RETRIES", "4"))
+        self.base_delay = base_delay if base_delay is not None else float(os.getenv("GROQ_BACKOFF_BASE", "1.0"))
+        self.max_delay = max_delay if max_delay is not None else float(os.getenv("GROQ_BACKOFF_MAX", "30"))
+        self._queue = []                    # heap de [prioridade, ordem, tokens]
+        self._seq = itertools.count()
+        self._changed = asyncio.Event()
+        self._paused_until = 0.0            # retry-after / reset informado pelo provedor
+        self.granted = 0
+        self.waited_s = 0.0
+        self.throttled = 0                  # 429 recebidos
+        self.retries = 0
+
+    # === FILA ===
+    def _wait_time(self, amount):
+        now = time.monotonic()
+        return max(self._paused_until - now, self.requests.wait_time(1, now), self.tokens.wait_time(amount, now))
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def acquire(self, amount, priority=INTERACTIVE):
+        """Espera a vez (prioridade, depois ordem de chegada) e consome 1 requisição + `amount` tokens."""
+        entry = [priority, next(self._seq), amount]
+        heapq.heappush(self._queue, entry)
+        start = time.monotonic()
+        try:
+            while True:
+                timeout = None
+                if self._queue[0] is entry:
+                    timeout = self._wait_time(amount)
+                    if timeout <= 0:
+                        heapq.heappop(self._queue)
+                        now = time.monotonic()
+                        self.requests.take(1, now)
+                        self.tokens.take(amount, now)
+                        break
+                changed = self._changed
+                try:
+                    await asyncio.wait_for(changed.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            if entry in self._queue:
+                self._queue.remove(entry)
+                heapq.heapify(self._queue)
+            raise
+        finally:
+            self._notify()
+        waited = time.monotonic() - start
+        self.granted += 1
+        self.waited_s += waited
+        if waited > 1:
+            logger.debug(f"🚦 Pedido ao LLM esperou {waited:.1f}s na fila (prioridade {priority})")
+        return amount
+
+    def settle(self, reserved, used):
+        """Devolve ao balde a diferença entre os tokens reservados e os realmente usados."""
+        if used is not None:
+            self.tokens.tokens = min(self.tokens.capacity, self.tokens.tokens + reserved - used)
+            self._notify()
+
+    # === SINAIS DO PROVEDOR ===
+    def observe_headers(self, headers):
+        """Lê x-ratelimit-* / retry-after de uma resposta HTTP da Groq."""
+        remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+        if remaining_tokens is not None:
+            self.tokens.limit(float(remaining_tokens), headers.get("x-ratelimit-limit-tokens"))
+        remaining_requests = headers.get("x-ratelimit-remaining-requests")
+        if remaining_requests is not None and float(remaining_requests) <= 0:
+            # Na Groq o limite de requisições dos headers é diário: sem saldo, pausa até o reset
+            self.pause(parse_duration(headers.get("x-ratelimit-reset-requests")))
+        retry_after = parse_duration(headers.get("retry-after"))
+        if retry_after:
+            self.pause(retry_after)
+        self._notify()
+
+    def pause(self, seconds):
+        if seconds:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def backoff(self, attempt, error):
+        """Espera antes da próxima tentativa: jitter total, nunca antes do retry-after."""
+        self.retries += 1
+        if getattr(error, "status_code", None) == 429 or "RateLimit" in type(error).__name__:
+            self.throttled += 1
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        return max(delay, self._paused_until - time.monotonic())
+
+    def install(self, client):
+        """Liga observe_headers() às respostas de um httpx.AsyncClient."""
+        async def on_response(response):
+            self.observe_headers(response.headers)
+        client.event_hooks["response"].append(on_response)
+        return client
+
+    def stats(self):
+        return {
+            "granted": self.granted,
+            "avg_wait_s": round(self.waited_s / self.granted, 3) if self.granted else 0.0,
+            "queued": len(self._queue),
+            "throttled": self.throttled,
+            "retries": self.retries,
+            "rpm": self.requests.capacity,
+            "tpm": self.tokens.capacity,
+        }
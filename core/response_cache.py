@@ -0,0 +1,122 @@
+import os
+import re
+import time
+import hashlib
+from loguru import logger
+
+from memory_index import normalize
+from intent_cache import WEEKDAY_RE, DATE_RE, CLOCK_RE, cache_key
+import vector_memory
+
+# Perguntas cuja resposta muda com o relógio ou com o mundo: nunca saem do cache
+TIME_SENSITIVE_RE = re.compile(
+    r"\b(hoje|amanha|ontem|agora|agorinha|hora|horas|horario|data|dia|semana|mes|ano|"
+    r"proxim\w*|ultim\w*|atual\w*|recente\w*|noticia\w*|clima|previsao|temperatura|chuva|"
+    r"cotacao|preco\w*|dolar|euro|bitcoin|placar|jogo|resultado\w*|"
+    r"today|tomorrow|yesterday|now|time|date|week|month|year|latest|news|weather|price)\b"
+)
+
+
+def memories_key(memories):
+    """Hash das memórias injetadas no prompt: outra memória = outra resposta."""
+    digest = hashlib.sha1()
+    for mem in memories or ():
+        digest.update(mem["content"].encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """
+    Cache semântico das respostas de chat (generate_message() e o modo de chamada única).
+    A chave é o embedding da mensagem + o hash das memórias injetadas: perguntas
+    quase iguais ("quais são suas capacidades?" / "quais sao as suas capacidades")
+    com as mesmas memórias reaproveitam a resposta sem chamar o LLM. O embedding
+    padrão é de hashing (palavras, sem sinônimos): abreviações como "vc" no lugar
+    de "você" ficam abaixo do limiar. Mensagens que dependem da data/hora ou de
+    informação do mundo não são cacheadas.
+    """
+    def __init__(self, embedder=None, threshold=None, ttl=None, max_size=None):
+        self.threshold = threshold if threshold is not None else float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.92"))
+        self.ttl = ttl if ttl is not None else float(os.getenv("RESPONSE_CACHE_TTL", "86400"))
+        self.max_size = max_size if max_size is not None else int(os.getenv("RESPONSE_CACHE_SIZE", "256"))
+        if embedder is None and vector_memory.np is None:
+            logger.warning("⚠️ numpy não instalado: cache de respostas desligado.")
+            self.max_size = 0
+        self.embedder = embedder or vector_memory.HashingEmbedder()
+        self._entries = {}      # hash das memórias -> [[vetor, resposta, expira_em, latência do LLM]]
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0        # Mensagens sensíveis ao tempo (nem consultam o cache)
+        self.saved_s = 0.0      # Latência do LLM poupada pelos acertos
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    def cacheable(self, task):
+        norm = normalize(task)
+        return not (TIME_SENSITIVE_RE.search(norm) or WEEKDAY_RE.search(norm)
+                    or DATE_RE.search(norm) or CLOCK_RE.search(norm))
+
+    def lookup(self, task, memories):
+        """Retorna (resposta ou None, chave para o put()). Chave None = não cachear."""
+        if not self.enabled:
+            return None, None
+        if not self.cacheable(task):
+            self.skipped += 1
+            return None, None
+        mem_key = memories_key(memories)
+        # Texto normalizado (sem acentos/pontuação): "quem é você?" = "quem e voce"
+        vector = self.embedder.embed([cache_key(task)])[0]
+        now = time.monotonic()
+        bucket = self._entries.get(mem_key, [])
+        live = [entry for entry in bucket if entry[2] >= now]
+        self._size -= len(bucket) - len(live)
+        if live:
+            self._entries[mem_key] = live
+        else:
+            self._entries.pop(mem_key, None)
+
+        best, best_score = None, self.threshold
+        for entry in live:
+            score = float(entry[0] @ vector)
+            if score >= best_score:
+                best, best_score = entry, score
+        if best is None:
+            self.misses += 1
+            return None, (mem_key, vector)
+        self.hits += 1
+        self.saved_s += best[3]
+        logger.debug(f"🗂️ Resposta em cache (similaridade {best_score:.2f}): {task[:40]}")
+        if (self.hits + self.misses) % 50 == 0:
+            logger.info(f"🗂️ Cache de respostas: {self.stats()}")
+        return best[1], None
+
+    def put(self, key, response, latency):
+        if key is None or not response or response.startswith("Erro:"):
+            return
+        mem_key, vector = key
+        self._entries.setdefault(mem_key, []).append([vector, response, time.monotonic() + self.ttl, latency])
+        self._size += 1
+        while self._size > self.max_size:
+            # Sai a entrada que expira primeiro (a mais antiga, já que o TTL é fixo)
+            oldest_key = min(self._entries, key=lambda k: self._entries[k][0][2])
+            bucket = self._entries[oldest_key]
+            bucket.pop(0)
+            if not bucket:
+                del self._entries[oldest_key]
+            self._size -= 1
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            "skipped": self.skipped,
+            "size": self._size,
+            "saved_s": round(self.saved_s, 3),
+            "avg_saved_ms": round(self.saved_s / self.hits * 1000, 1) if self.hits else 0.0,
+        }
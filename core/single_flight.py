@@ -0,0 +1,123 @@
+import asyncio
+import hashlib
+from loguru import logger
+
+
+def flight_key(model, payload):
+    """Chave da requisição: modelo + hash do prompt (string, mensagens ou dict da chain)."""
+    return hashlib.sha256(f"{model}\0{payload!r}".encode("utf-8")).hexdigest()
+
+
+class _Flight:
+    """Uma requisição em voo: a task que fala com o LLM e quem está esperando por ela."""
+    __slots__ = ("task", "waiters", "chunks", "done", "error", "changed")
+
+    def __init__(self):
+        self.task = None
+        self.waiters = 0
+        self.chunks = []                    # Só streaming: pedaços já recebidos
+        self.done = False
+        self.error = None
+        self.changed = asyncio.Event()      # Só streaming: chegou pedaço novo ou acabou
+
+
+class SingleFlight:
+    """
+    Coalescência de requisições idênticas em andamento ("single flight").
+    Chamadas concorrentes com a mesma chave compartilham uma única chamada ao LLM
+    e recebem o mesmo resultado; ao terminar a chave sai da tabela, então não há
+    resposta velha (não é cache). A chamada só é cancelada quando todos os
+    interessados desistem.
+    """
+    def __init__(self):
+        self._calls = {}
+        self._streams = {}
+        self.requests = 0
+        self.upstream = 0
+
+    async def do(self, key, call):
+        """Executa `call()` (corrotina) uma vez por chave em voo e devolve o resultado a todos."""
+        self._count()
+        flight = self._calls.get(key)
+        if flight is None:
+            flight = self._calls[key] = _Flight()
+            self.upstream += 1
+            flight.task = asyncio.ensure_future(call())
+            flight.task.add_done_callback(lambda _: self._calls.get(key) is flight and self._calls.pop(key))
+        else:
+            logger.debug(f"🔗 Requisição idêntica em voo: reaproveitando ({key[:8]})")
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            self._leave(self._calls, key, flight)
+
+    async def stream(self, key, open_stream):
+        """
+        Como do(), para streaming: `open_stream()` devolve um async iterator; quem chega
+        depois recebe os pedaços já emitidos e segue junto até o fim.
+        """
+        self._count()
+        flight = self._streams.get(key)
+        if flight is None:
+            flight = self._streams[key] = _Flight()
+            self.upstream += 1
+            flight.task = asyncio.ensure_future(self._pump(key, flight, open_stream))
+        else:
+            logger.debug(f"🔗 Stream idêntico em voo: reaproveitando ({key[:8]})")
+        flight.waiters += 1
+        try:
+            i = 0
+            while True:
+                while i < len(flight.chunks):
+                    yield flight.chunks[i]
+                    i += 1
+                if flight.done:
+                    break
+                flight.changed.clear()
+                await flight.changed.wait()
+            if flight.error is not None:
+                raise flight.error
+        finally:
+            self._leave(self._streams, key, flight)
+
+    async def _pump(self, key, flight, open_stream):
+        try:
+            stream = open_stream()
+            try:
+                async for chunk in stream:
+                    flight.chunks.append(chunk)
+                    flight.changed.set()
+            finally:
+                await stream.aclose()
+        except Exception as e:
+            flight.error = e        # Repassado a todos os interessados
+        finally:
+            # Acabou (ou falhou): quem chegar agora abre um stream novo
+            if self._streams.get(key) is flight:
+                del self._streams[key]
+            flight.done = True
+            flight.changed.set()
+
+    def _count(self):
+        self.requests += 1
+        if self.requests % 100 == 0:
+            logger.info(f"🔗 Coalescência de requisições ao LLM: {self.stats()}")
+
+    @staticmethod
+    def _leave(table, key, flight):
+        flight.waiters -= 1
+        if flight.waiters == 0 and not flight.task.done():
+            flight.task.cancel()    # Ninguém mais quer a resposta: libera o LLM
+            if table.get(key) is flight:
+                del table[key]
+
+    def stats(self):
+        coalesced = self.requests - self.upstream
+        return {
+            "requests": self.requests,
+            "upstream": self.upstream,
+            "coalesced": coalesced,
+            "coalesced_ratio": round(coalesced / self.requests, 4) if self.requests else 0.0,
+            "in_flight": len(self._calls) + len(self._streams),
+        }
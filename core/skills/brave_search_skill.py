@@ -21,7 +21,7 @@ class BraveSearchSkill:
 
         try:
             response = requests.get(self.base_url, headers=headers, params=params)
-            if response.status_status == 200:
+            if response.status_code == 200:
                 results = response.json().get("web", {}).get("results", [])
                 return [f"{r['title']}: {r['url']}\n{r['description']}" for r in results]
             else:
@@ -39,6 +39,25 @@ class SchedulerSkill:
         schedule.every(minutes).minutes.do(job)
         return f"⏰ Combinado! Daqui a {minutes} min te aviso."
 
+    def run_periodic(self, minutes, coro_func, name="tarefa"):
+        """Roda a corotina `coro_func()` a cada `minutes` minutos no loop do bot, sem sobrepor execuções."""
+        state = {"task": None}
+        def job():
+            running = state["task"]
+            if running is not None and not running.done():
+                return  # A execução anterior ainda não terminou
+            if self.loop:
+                state["task"] = self.loop.create_task(self._run_background(coro_func, name))
+
+        schedule.every(minutes).minutes.do(job)
+        logger.info(f"⏰ Tarefa periódica '{name}' a cada {minutes} min")
+
+    async def _run_background(self, coro_func, name):
+        try:
+            await coro_func()
+        except Exception as e:
+            logger.error(f"Erro na tarefa periódica '{name}': {e}")
+
     def set_daily(self, chat_id, time_str, message):
         def job():
             self._trigger(chat_id, message)
@@ -0,0 +1,67 @@
+import os
+import time
+import asyncio
+from loguru import logger
+from telegram.error import BadRequest, RetryAfter
+
+TELEGRAM_LIMIT = 4096       # Tamanho máximo de uma mensagem
+PLACEHOLDER = "✍️"
+CURSOR = " ▌"
+
+
+def _clean(text):
+    # Mesmo filtro das respostas normais: Telegram Markdown usa * simples
+    return text.replace("**", "*").strip()
+
+
+async def _edit(msg, text, parse_mode=None):
+    """Edita a mensagem respeitando o flood control do Telegram. Retorna False se o Markdown falhou."""
+    while True:
+        try:
+            await msg.edit_text(text, parse_mode=parse_mode)
+            return True
+        except RetryAfter as e:
+            wait = e.retry_after.total_seconds() if hasattr(e.retry_after, "total_seconds") else e.retry_after
+            logger.warning(f"⏳ Telegram pediu para esperar {wait}s entre edições")
+            await asyncio.sleep(wait)
+        except BadRequest as e:
+            if "not modified" in str(e).lower():
+                return True
+            if parse_mode:
+                return False
+            raise
+
+
+async def stream_reply(message, chunks, edit_interval=None):
+    """
+    Envia a resposta em streaming: um placeholder na hora e edições com o texto acumulado,
+    no máximo uma a cada `edit_interval` segundos (limite de edições do Telegram).
+    As edições parciais vão sem parse_mode (Markdown pela metade quebraria a edição);
+    a final aplica o Markdown e, se o Telegram recusar, cai para texto puro.
+    Retorna o texto final.
+    """
+    interval = edit_interval if edit_interval is not None else float(os.getenv("TELEGRAM_EDIT_INTERVAL", "1.0"))
+    msg = await message.reply_text(PLACEHOLDER)
+    text = ""
+    shown = ""
+    last_edit = time.monotonic()
+    async for chunk in chunks:
+        text += chunk
+        now = time.monotonic()
+        if now - last_edit >= interval and text.strip():
+            partial = _clean(text)[:TELEGRAM_LIMIT - len(CURSOR)] + CURSOR
+            if partial != shown:
+                await _edit(msg, partial)
+                shown = partial
+                last_edit = time.monotonic()
+
+    final = _clean(text) or "…"
+    parts = [final[i:i + TELEGRAM_LIMIT] for i in range(0, len(final), TELEGRAM_LIMIT)]
+    if not await _edit(msg, parts[0], parse_mode="Markdown"):
+        await _edit(msg, parts[0])
+    for part in parts[1:]:
+        try:
+            await message.reply_text(part, parse_mode="Markdown")
+        except BadRequest:
+            await message.reply_text(part)
+    return final
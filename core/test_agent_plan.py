@@ -0,0 +1,44 @@
+from datetime import datetime, timezone, timedelta
+
+import pytest
+
+from agent import CaioAgent
+from intent_cache import IntentCache
+
+NOW = datetime(2026, 3, 2, 10, 0, tzinfo=timezone(timedelta(hours=-3)))
+
+
+@pytest.fixture
+def caio():
+    agent = CaioAgent.__new__(CaioAgent)     # Sem clientes de LLM: só o parser do plano
+    agent.intent_cache = IntentCache()
+    return agent
+
+
+def test_reply_with_literal_newline_keeps_tool_action(caio):
+    response = '{"actions": [{"action": "google_calendar_add", "summary": "Dentista"}], "reply": "Marcado!\nAté lá"}'
+    assert caio._parse_plan(response, "marca dentista", NOW)[0]["action"] == "google_calendar_add"
+
+
+def test_text_after_json_is_ignored(caio):
+    response = '```json\n{"actions": [{"action": "chat"}], "reply": "Oi!"}\n```\nEspero ter ajudado {sempre}'
+    assert caio._parse_plan(response, "oi tudo bem", NOW) == [{"action": "chat", "reply": "Oi!"}]
+
+
+def test_single_intent_object(caio):
+    assert caio._parse_plan('{"action": "email_check", "query": "is:unread"}', "tem email?", NOW) == \
+        [{"action": "email_check", "query": "is:unread"}]
+
+
+@pytest.mark.parametrize("response", ['"Olá!"', "42", '{"actions": "chat"}', '{"actions": [{"action": "chat"'])
+def test_unusable_json_falls_back(caio, response):
+    assert caio._parse_plan(response, "mensagem qualquer", NOW) is None
+
+
+def test_truncated_plan_keeps_actions_without_raw_reply(caio):
+    # A resposta cortada some; a de chat sai de generate_message()
+    assert caio._parse_plan('{"actions": [{"action": "chat"}], "reply": "Boa tar', "boa tarde", NOW) == [{"action": "chat"}]
+
+
+def test_plain_text_is_a_chat_reply(caio):
+    assert caio._parse_plan("Claro, **posso** ajudar.", "me ajuda", NOW) == [{"action": "chat", "reply": "Claro, *posso* ajudar."}]
@@ -0,0 +1,40 @@
+from datetime import datetime, timezone, timedelta
+
+from intent_cache import IntentCache
+
+BRT = timezone(timedelta(hours=-3))
+NOW = datetime(2026, 3, 3, 14, 13, tzinfo=BRT)
+
+
+def test_clock_reminder_minutes_follow_the_clock():
+    cache = IntentCache()
+    cache.put("me lembra às 15h de ligar pro banco", [{"action": "reminder_set", "minutes": 47, "message": "ligar pro banco"}], NOW)
+    later = cache.get("me lembra às 15h de ligar pro banco", NOW + timedelta(minutes=30))
+    assert later == [{"action": "reminder_set", "minutes": 17, "message": "ligar pro banco"}]
+
+
+def test_clock_reminder_in_the_past_is_a_miss():
+    cache = IntentCache()
+    cache.put("me lembra às 15h de ligar pro banco", [{"action": "reminder_set", "minutes": 47, "message": "ligar"}], NOW)
+    assert cache.get("me lembra às 15h de ligar pro banco", NOW + timedelta(minutes=50)) is None
+
+
+def test_offset_reminder_keeps_its_minutes():
+    cache = IntentCache()
+    cache.put("me lembra em 10 minutos de tirar o bolo", [{"action": "reminder_set", "minutes": 10, "message": "bolo"}], NOW)
+    assert cache.get("me lembra em 10 minutos de tirar o bolo", NOW + timedelta(minutes=30))[0]["minutes"] == 10
+
+
+def test_relative_day_is_a_wall_clock_anchor():
+    cache = IntentCache()
+    start = datetime(2026, 3, 4, 9, 0, tzinfo=BRT).isoformat()
+    cache.put("agende dentista amanhã", [{"action": "google_calendar_add", "summary": "Dentista", "start_time": start}], NOW)
+    replay = cache.get("agende dentista amanhã", NOW + timedelta(minutes=50))
+    assert replay[0]["start_time"] == start
+
+
+def test_reminder_for_explicit_date_is_not_cached():
+    cache = IntentCache()
+    cache.put("me lembra dia 20/03 do aniversário", [{"action": "reminder_set", "minutes": 24000, "message": "aniversário"}], NOW)
+    assert cache.get("me lembra dia 20/03 do aniversário", NOW) is None
+    assert cache.skipped == 1
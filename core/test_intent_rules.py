@@ -0,0 +1,52 @@
+import pytest
+
+from intent_rules import IntentRules
+
+
+@pytest.fixture(scope="module")
+def rules():
+    return IntentRules(min_confidence=0.8)
+
+
+@pytest.mark.parametrize("text", [
+    "cancela o lembrete em 10 minutos",
+    "não me lembra em 10 minutos de nada",
+    "nao precisa me avisar em 10 minutos",
+    "não precisa me avisar em 10 minutos",
+    "desmarca o lembrete de daqui a 5 min",
+    "esquece, não me lembre em 1 hora",
+    "don't remind me in 15 minutes",
+    "stop reminder in 5 minutes",
+    "não checa meus emails",
+])
+def test_negation_goes_to_llm(rules, text):
+    assert rules.classify(text) is None
+
+
+def test_plain_reminder_still_fast(rules):
+    intents = rules.classify("me lembra em 10 minutos de ligar pro joão")
+    assert intents == [{"action": "reminder_set", "minutes": 10, "message": "ligar pro joão"}]
+
+
+def test_greeting_still_fast(rules):
+    assert rules.classify("bom dia") == [{"action": "chat"}]
+
+
+@pytest.mark.parametrize("text", [
+    "você lembra o que eu te disse em 5 minutos?",
+    "lembra daquilo que falamos há 10 minutos atrás",
+    "lembra o que eu falei em 10 minutos",
+    "me lembra em 10 minutos?",
+])
+def test_questions_and_past_references_are_not_reminders(rules, text):
+    intents = rules.classify(text)
+    assert intents is None or intents[0]["action"] != "reminder_set"
+
+
+@pytest.mark.parametrize("text, message", [
+    ("oi, me lembra em 5 minutos de ligar pra mãe", "ligar pra mãe"),
+    ("Lembre-me em 20 minutos de tirar o bolo", "tirar o bolo"),
+    ("daqui a 20 minutos me lembra de sair", "sair"),
+])
+def test_reminder_message_drops_text_before_the_verb(rules, text, message):
+    assert rules.classify(text)[0]["message"] == message
@@ -0,0 +1,66 @@
+import time
+import random
+import asyncio
+
+from memory import MemorySystem
+from memory_consolidation import MemoryConsolidator, ExtractiveSummarizer, SEMANTIC_SOURCE
+
+TOPICS = ("academia treino corrida", "projeto cliente relatorio", "viagem hotel passagem", "mercado compras feira")
+
+
+def _store_old_day(memory, rng, days_ago, count=60):
+    base = time.time() - days_ago * 86400
+    for i in range(count):
+        text = f"{rng.choice(TOPICS)} {rng.getrandbits(40):x} {rng.getrandbits(40):x}"
+        memory.store(text, timestamp=base + i * 60, flush=False)
+
+
+def test_repeated_passes_do_not_rearchive_summaries(tmp_path, monkeypatch):
+    monkeypatch.setenv("MEMORY_ARCHIVE", "1")
+    rng = random.Random(3)
+    memory = MemorySystem(str(tmp_path / "brain.json"), storage="journal", lazy_load=False)
+    consolidator = MemoryConsolidator(ExtractiveSummarizer(), min_age_days=7, min_entries=10)
+
+    for days_ago in (30, 20, 10):
+        _store_old_day(memory, rng, days_ago)
+        assert asyncio.run(consolidator.consolidate(memory)) > 0
+    memory.flush()
+
+    archived = [mem for _, mem in memory.archive.iter_entries()]
+    assert len(archived) == 180
+    assert not any(mem["source"] == SEMANTIC_SOURCE for mem in archived)
+    episodic = memory.data["episodic"]
+    summaries = [episodic.get(i)["content"] for i in range(len(episodic))
+                 if episodic.get(i)["source"] == SEMANTIC_SOURCE]
+    assert summaries and len(summaries) == len(set(summaries))
+
+    # O estado sobrevive ao replay do diário (compact com "skip")
+    reopened = MemorySystem(str(tmp_path / "brain.json"), storage="journal", lazy_load=False)
+    assert len(reopened.data["episodic"]) == len(episodic)
+    assert len(list(reopened.archive.iter_entries())) == 180
+    memory.close()
+
+
+def test_refreshed_entry_at_head_does_not_block_consolidation(tmp_path, monkeypatch):
+    monkeypatch.setenv("MEMORY_ARCHIVE", "1")
+    rng = random.Random(5)
+    memory = MemorySystem(str(tmp_path / "brain.json"), storage="journal", lazy_load=False)
+    memory.store("oi", timestamp=time.time() - 31 * 86400, flush=False)
+    _store_old_day(memory, rng, 30, count=200)
+    # O mesmo "oi" hoje: a deduplicação reforça a memória antiga (timestamp atualizado, mesma posição)
+    memory.store("oi", flush=False)
+    episodic = memory.data["episodic"]
+    assert len(episodic) == 201 and episodic.get(0)["timestamp"] > time.time() - 60
+
+    consolidator = MemoryConsolidator(ExtractiveSummarizer(), min_age_days=7, min_entries=10)
+    assert asyncio.run(consolidator.consolidate(memory)) == 200
+    memory.flush()
+
+    archived = [mem["content"] for _, mem in memory.archive.iter_entries()]
+    assert len(archived) == 200 and "oi" not in archived
+    contents = [episodic.get(i)["content"] for i in range(len(episodic))]
+    assert contents.count("oi") == 1
+
+    reopened = MemorySystem(str(tmp_path / "brain.json"), storage="journal", lazy_load=False)
+    assert [reopened.data["episodic"].get(i)["content"] for i in range(len(reopened.data["episodic"]))] == contents
+    memory.close()
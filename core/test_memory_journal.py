@@ -0,0 +1,93 @@
+import json
+
+from memory import MemorySystem
+
+
+def _open(path):
+    return MemorySystem(path, storage="journal", lazy_load=False)
+
+
+def _contents(memory):
+    return [memory.data["episodic"].get(i)["content"] for i in range(len(memory.data["episodic"]))]
+
+
+def _journal(memory):
+    with open(memory.backend.journal_path, "rb") as f:
+        return f.read()
+
+
+def test_truncated_tail_is_dropped_and_journal_keeps_working(tmp_path):
+    path = str(tmp_path / "brain.json")
+    memory = _open(path)
+    memory.set_preference("cidade", "Salvador")
+    for text in ("reunião com o cliente na segunda", "comprar café no mercado", "treino de perna na academia"):
+        memory.store(text)
+    journal_path = memory.backend.journal_path
+    del memory      # Crash: sem close(), nada de snapshot
+    # Escrita interrompida no meio da linha
+    with open(journal_path, "ab") as f:
+        f.write(b'{"op":"store","content":"linha pela met')
+
+    recovered = _open(path)
+    assert _contents(recovered) == ["reunião com o cliente na segunda", "comprar café no mercado",
+                                    "treino de perna na academia"]
+    assert recovered.get_preference("cidade") == "Salvador"
+    assert _journal(recovered).endswith(b"\n")
+
+    # A próxima linha não fica colada no fragmento descartado
+    recovered.store("consulta no médico quinta de manhã")
+    del recovered
+    reopened = _open(path)
+    assert _contents(reopened)[-1] == "consulta no médico quinta de manhã"
+    assert len(reopened.data["episodic"]) == 4
+    reopened.close()
+
+
+def test_corrupt_middle_line_is_skipped(tmp_path):
+    path = str(tmp_path / "brain.json")
+    memory = _open(path)
+    memory.store("primeira memória sobre python")
+    journal_path = memory.backend.journal_path
+    memory.store("segunda memória sobre viagem")
+    del memory
+    with open(journal_path, "rb") as f:
+        lines = f.read().splitlines(keepends=True)
+    with open(journal_path, "wb") as f:
+        f.write(lines[0] + b"{lixo\n" + lines[1])
+
+    recovered = _open(path)
+    assert _contents(recovered) == ["primeira memória sobre python", "segunda memória sobre viagem"]
+    recovered.close()
+
+
+def test_ops_already_in_snapshot_are_not_replayed(tmp_path):
+    path = str(tmp_path / "brain.json")
+    memory = _open(path)
+    memory.store("livro novo para ler nas férias")
+    memory.store("pagar a conta de luz")
+    journal = _journal(memory)
+    memory.backend.snapshot(memory.data)
+    del memory
+    # Crash entre o snapshot e o truncate: o diário antigo continua no disco
+    with open(path.replace(".json", ".journal"), "wb") as f:
+        f.write(journal)
+
+    recovered = _open(path)
+    assert _contents(recovered) == ["livro novo para ler nas férias", "pagar a conta de luz"]
+    recovered.close()
+
+
+def test_legacy_json_without_journal_loads(tmp_path):
+    path = tmp_path / "brain.json"
+    path.write_text(json.dumps({
+        "profile": {"nome": "Gleisson"},
+        "episodic": [{"content": "gosta de café sem açúcar", "source": "chat", "importance": 2,
+                      "timestamp": 1700000000.0, "date": "2023-11-14 19:13:20"}],
+    }), encoding="utf-8")
+
+    memory = _open(str(path))
+    assert _contents(memory) == ["gosta de café sem açúcar"]
+    assert memory.get_preference("nome") == "Gleisson"
+    memory.store("prefere reuniões pela manhã")
+    memory.close()
+    assert _contents(_open(str(path))) == ["gosta de café sem açúcar", "prefere reuniões pela manhã"]
@@ -0,0 +1,101 @@
+import asyncio
+import threading
+
+from memory import PartitionedMemory
+from memory_writer import MemoryWriter
+
+
+def _partitions(tmp_path, max_active=1):
+    return PartitionedMemory(base_dir=str(tmp_path / "chats"), max_active=max_active,
+                             legacy_file=str(tmp_path / "brain_data.json"), owner_chat_id="0")
+
+
+def _contents(memory):
+    return [memory.data["episodic"].get(i)["content"] for i in range(len(memory.data["episodic"]))]
+
+
+def test_leased_partition_is_not_evicted(tmp_path):
+    async def scenario():
+        memory = _partitions(tmp_path)
+        writer = MemoryWriter(flush_interval=0.01)
+        writer.start()
+        memory.attach_writer(writer)
+
+        async with memory.lease("a") as chat_a:
+            await chat_a.astore("primeira mensagem do chat a")
+            # Outro chat chega com o limite (1) já ocupado: "a" está emprestado e fica
+            async with memory.lease("b") as chat_b:
+                await chat_b.astore("mensagem do chat b sobre futebol")
+            assert "a" in memory.active_chats()
+            # Ainda é a mesma instância: nada de duas MemorySystem no mesmo diário
+            async with memory.lease("a") as again:
+                assert again is chat_a
+            await chat_a.astore("segunda mensagem do chat a depois da troca")
+        assert memory.active_chats() == ["a"]
+
+        # "b" descarrega "a"; ao voltar, "a" é lido do disco com as duas mensagens
+        async with memory.lease("b"):
+            pass
+        async with memory.lease("a") as reopened:
+            await reopened.aensure_loaded()
+            assert reopened is not chat_a
+            assert _contents(reopened) == ["primeira mensagem do chat a", "segunda mensagem do chat a depois da troca"]
+        await writer.stop()
+        memory.close()
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_leases_share_one_instance(tmp_path):
+    async def scenario():
+        memory = _partitions(tmp_path)
+
+        async def write(i):
+            async with memory.lease("a") as chat:
+                await asyncio.sleep(0)
+                await chat.astore(f"mensagem concorrente numero {i} com texto distinto {i * 7919}")
+                return chat
+
+        chats = await asyncio.gather(*(write(i) for i in range(5)))
+        assert all(chat is chats[0] for chat in chats)
+        async with memory.lease("b"):
+            pass
+        async with memory.lease("a") as reopened:
+            await reopened.aensure_loaded()
+            assert len(reopened.data["episodic"]) == 5
+        memory.close()
+
+    asyncio.run(scenario())
+
+
+def test_partition_leased_during_eviction_stays_active(tmp_path):
+    async def scenario():
+        memory = _partitions(tmp_path, max_active=3)
+        chat_a = memory.for_chat("a")      # Ativa, sem empréstimo
+        started, gate = threading.Event(), threading.Event()
+        close_a = chat_a.close
+
+        def slow_close():
+            started.set()
+            gate.wait(5)
+            close_a()
+        chat_a.close = slow_close
+
+        async with memory.lease("c"):
+            release_b = memory.lease("b")
+            chat_b = await release_b.__aenter__()
+            memory.max_active = 1
+            # Devolver "b" descarrega "a" (lento) e, pelo cálculo antigo, depois "b"
+            evicting = asyncio.create_task(release_b.__aexit__(None, None, None))
+            while not started.is_set():
+                await asyncio.sleep(0.01)
+            async with memory.lease("b") as again:
+                gate.set()
+                await evicting
+                assert again is chat_b
+                assert "b" in memory.active_chats()
+                await again.astore("mensagem depois da descarga do chat a")
+        assert "a" not in memory.active_chats()
+        memory.close()
+
+    asyncio.run(scenario())
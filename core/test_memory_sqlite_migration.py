@@ -0,0 +1,45 @@
+import random
+
+from memory import MemorySystem, MAX_EPISODIC
+
+
+def _text(rng, i):
+    words = " ".join(f"{rng.getrandbits(40):x}" for _ in range(4))
+    return f"{words} palavra{i}"
+
+
+def test_migration_keeps_archive_and_merges(tmp_path, monkeypatch):
+    monkeypatch.setenv("MEMORY_ARCHIVE", "1")
+    path = str(tmp_path / "brain.json")
+    rng = random.Random(1)
+    texts = [_text(rng, i) for i in range(1500)]
+
+    journal = MemorySystem(path, storage="journal", snapshot_every=700, lazy_load=False)
+    for text in texts:
+        journal.store(text, importance=1)
+    # Quase-duplicata de uma memória quente: vira "merge" no diário
+    journal.store(texts[-1], importance=3)
+    journal.flush()
+    assert journal.archive is not None and len(journal.archive) >= 1500 - MAX_EPISODIC
+    del journal     # Sem close(): o diário ainda tem operações depois do último snapshot
+
+    sqlite = MemorySystem(path, storage="sqlite", lazy_load=False)
+    rows = sqlite.backend.conn.execute("SELECT COUNT(*) FROM episodic").fetchone()[0]
+    assert rows == 1500
+    importance = sqlite.backend.conn.execute(
+        "SELECT importance FROM episodic WHERE content = ?", (texts[-1],)).fetchone()[0]
+    assert importance == 4
+    # palavra5 está no arquivo frio do modo diário
+    assert [m["content"] for m in sqlite.recall("palavra5")] == [texts[5]]
+    sqlite.close()
+
+
+def test_blend_normalizes_by_best_score(tmp_path):
+    memory = MemorySystem(str(tmp_path / "brain.json"), storage="journal", lazy_load=False)
+    now = 1_700_000_000
+    # Como no arquivo frio: ordem de recência, não de score
+    hits = [({"content": "a", "importance": 1, "timestamp": now}, 1),
+            ({"content": "b", "importance": 1, "timestamp": now}, 3)]
+    ranked = memory._blend(hits, 2)
+    assert [mem["content"] for mem, _ in ranked] == ["b", "a"]
+    assert all(score <= 1.0 for _, score in ranked)
@@ -0,0 +1,22 @@
+from response_cache import ResponseCache
+
+MEMORIES = [{"content": "o usuário mora em Salvador"}]
+
+
+def _cached(first, second, later_memories=MEMORIES):
+    cache = ResponseCache(threshold=0.92)
+    _, key = cache.lookup(first, MEMORIES)
+    cache.put(key, "Agenda, e-mail, Drive e busca na web.", 1.2)
+    return cache.lookup(second, later_memories)[0]
+
+
+def test_near_identical_question_hits():
+    assert _cached("quais são suas capacidades?", "quais sao as suas capacidades") == "Agenda, e-mail, Drive e busca na web."
+
+
+def test_abbreviation_stays_below_threshold():
+    assert _cached("o que você sabe fazer?", "o que vc sabe fazer") is None
+
+
+def test_other_memories_miss():
+    assert _cached("quais são suas capacidades?", "quais são suas capacidades?", later_memories=[]) is None
@@ -0,0 +1,117 @@
+import zlib
+import importlib
+
+from memory_index import normalize, tokenize
+
+try:
+    import numpy as np
+except ImportError:  # Busca vetorial é opcional
+    np = None
+
+
+class HashingEmbedder:
+    """
+    Embedder local e determinístico (funciona offline).
+    Usa o "hashing trick": termos e trigramas de caracteres são espalhados
+    com sinal em `dim` posições — uma projeção aleatória esparsa do bag-of-words.
+    """
+    def __init__(self, dim=256):
+        self.dim = dim
+
+    def _features(self, text):
+        terms = tokenize(text)
+        feats = [(t, 1.0) for t in terms]
+        # Trigramas aproximam variações ("reuniao"/"reunioes")
+        for word in normalize(text).split():
+            padded = f"#{word}#"
+            feats.extend((padded[i:i + 3], 0.5) for i in range(len(padded) - 2))
+        return feats
+
+    def embed(self, texts):
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feat, weight in self._features(text):
+                h = zlib.crc32(feat.encode("utf-8"))
+                out[row, h % self.dim] += weight if (h >> 31) & 1 else -weight
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return out / norms
+
+
+def load_embedder(spec="hashing", dim=256):
+    """'hashing' (padrão) ou 'modulo:Classe' de um embedder com `.dim` e `.embed(textos)`."""
+    if not spec or spec == "hashing":
+        return HashingEmbedder(dim=dim)
+    module_name, _, attr = spec.partition(":")
+    return getattr(importlib.import_module(module_name), attr)()
+
+
+class VectorIndex:
+    """
+    Matriz float32 contígua com um vetor normalizado por memória.
+    Top-k = um único matmul + argpartition. As memórias saem pela cauda
+    (mais antigas), então as linhas vivas são sempre matrix[start:n].
+    A camada quente tem no máximo MAX_EPISODIC vetores: a busca exata já é
+    rápida, sem índice aproximado.
+    """
+    def __init__(self, dim, capacity=1024):
+        self.dim = dim
+        self.matrix = np.zeros((capacity, dim), dtype=np.float32)
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.start = 0
+        self.n = 0
+
+    def __len__(self):
+        return self.n - self.start
+
+    def _reserve(self, extra):
+        if self.n + extra <= len(self.matrix):
+            return
+        live = len(self)
+        capacity = max(1024, 2 * (live + extra))
+        for name in ("matrix", "ids"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:live] = old[self.start:self.n]
+            setattr(self, name, new)
+        self.start, self.n = 0, live
+
+    def add(self, doc_ids, vectors):
+        count = len(doc_ids)
+        self._reserve(count)
+        self.matrix[self.n:self.n + count] = vectors
+        self.ids[self.n:self.n + count] = doc_ids
+        self.n += count
+
+    def remove_oldest(self, count):
+        self.start = min(self.start + count, self.n)
+
+    def search(self, query, k):
+        """Retorna [(doc_id, cosseno)] dos k vizinhos mais próximos."""
+        if not len(self):
+            return []
+        scores = self.matrix[self.start:self.n] @ query
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(self.ids[self.start + i]), float(scores[i])) for i in top]
+
+
+class VectorMemory:
+    """Liga o embedder ao índice; usada pelo MemorySystem no modo de recall "vector"."""
+    def __init__(self, embedder=None):
+        self.embedder = embedder or HashingEmbedder()
+        self.index = VectorIndex(self.embedder.dim)
+
+    def add(self, doc_id, text):
+        self.index.add([doc_id], self.embedder.embed([text]))
+
+    def add_many(self, doc_ids, texts):
+        if doc_ids:
+            self.index.add(doc_ids, self.embedder.embed(texts))
+
+    def remove_oldest(self, count):
+        self.index.remove_oldest(count)
+
+    def search(self, query, k):
+        return self.index.search(self.embedder.embed([query])[0], k)